@@ -9,7 +9,8 @@ constraints, and an objective--as well as solving.
 It also contains methods to display the solution
 """
 
-from pyscipopt import Model, quicksum
+from pyscipopt import Model, quicksum, Eventhdlr, Conshdlr, SCIP_EVENTTYPE, \
+	SCIP_RESULT, SCIP_STAGE
 # from gurobipy import *
 import numpy as np
 import pandas as pd
@@ -17,6 +18,15 @@ from os import system
 import pickle 
 import timeit # just to check setuptime
 import datetime
+import json
+import tracemalloc
+import hashlib
+import os
+import tempfile
+import shutil
+import multiprocessing
+import queue
+from functools import wraps
 
 # Apparently need this to be used with tkinter?
 import matplotlib
@@ -28,6 +38,165 @@ from Requirement import *
 from StudentMetadata import *
 
 from Solution import *
+from Portfolio import *
+
+
+def phase(method):
+	"""
+	Decorator for the Optimizer's set up, build and solve methods, adds a
+	record of each call to `build_report`: wall time and the variables and
+	constraints it added (and with `profile` the non-zeros it added and the
+	peak Python memory during the call)
+	"""
+	@wraps(method)
+	def wrapper(self, *args, **kwargs):
+		before = self.get_model_size()
+		if self.profile:
+			tracemalloc.reset_peak()
+		start = timeit.default_timer()
+
+		result = method(self, *args, **kwargs)
+
+		record = {"phase":method.__name__,
+			"seconds":timeit.default_timer() - start}
+		after = self.get_model_size()
+		record["variables"] = after[0] - before[0]
+		record["constraints"] = after[1] - before[1]
+		if self.profile:
+			record["nonzeros"] = self.count_nonzeros(before[1])
+			record["peak memory (MB)"] = tracemalloc.get_traced_memory()[1]/1e6
+		self.build_report.append(record)
+
+		# keep the counts consistent with the model
+		if hasattr(self, "m"):
+			self.num_vars, self.num_cons = after
+		if self.profile and self.save_location is not None:
+			self.save_build_report()
+		return result
+	return wrapper
+
+
+class Progress(Eventhdlr):
+	"""
+	Event handler that `Optimizer.optimize` adds to the model (if it has a
+	`progress` callback or a `checkpoint_interval`), on every new best
+	solution it records the primal and dual bound, gap, seconds since the
+	start of the solve and number of solutions in `progress_log` and
+	passes the record to `progress`, and saves a checkpoint if the last
+	one is at least `checkpoint_interval` seconds old
+	"""
+	def __init__(self, optimizer):
+		self.optimizer = optimizer
+
+	def eventinit(self):
+		self.start = timeit.default_timer()
+		self.last_checkpoint = None
+		self.model.catchEvent(SCIP_EVENTTYPE.BESTSOLFOUND, self)
+
+	def eventexit(self):
+		self.model.dropEvent(SCIP_EVENTTYPE.BESTSOLFOUND, self)
+
+	def eventexec(self, event):
+		O = self.optimizer
+		now = timeit.default_timer()
+		# (the primal bound is only updated after this event)
+		primal = self.model.getSolObjVal(self.model.getBestSol())
+		dual = self.model.getDualbound()
+		record = {"seconds":now - self.start, "primal":primal, "dual":dual,
+			"gap":abs(primal - dual)/max(min(abs(primal), abs(dual)), 1e-9),
+			"solutions":self.model.getNSols()}
+		O.progress_log.append(record)
+		if O.progress is not None:
+			O.progress(record)
+
+		if O.checkpoint_interval is None or O.save_location is None:
+			return
+		if self.last_checkpoint is None or \
+			now - self.last_checkpoint >= O.checkpoint_interval:
+			O.save_checkpoint()
+			self.last_checkpoint = timeit.default_timer()
+
+
+class LazyRows(Conshdlr):
+	"""
+	Constraint handler for `Optimizer(lazy=True)`, it holds the rows
+	sum(coef*var) <= rhs that were left out of the model (by family, see
+	`Optimizer.add_row`) and checks each candidate solution against them.
+	Violated rows are added to the model as constraints (counted in
+	`added`), a solution from a heuristic that violates one is rejected.
+	The variables are locked as the rows would lock them, so presolve
+	can't fix them the wrong way
+	"""
+	def __init__(self):
+		self.rows = {} # family --> list of ([(variable, coefficient)], rhs)
+		self.added = {} # family --> number of rows added in this solve
+		self.in_model = set() # (family, row number) added in this solve
+
+	def consinit(self, constraints):
+		# a new transformed problem, without any of the rows
+		self.added = {}
+		self.in_model = set()
+
+	def get_violated(self, solution=None):
+		"""
+		Returns the (family, row number) of the rows not in the model that
+		`solution` violates (None for the current LP or pseudo solution)
+		"""
+		violated = []
+		for family in self.rows:
+			for n, (terms, rhs) in enumerate(self.rows[family]):
+				if (family, n) in self.in_model:
+					continue
+				activity = sum(coef*self.model.getSolVal(solution, var)
+					for var, coef in terms)
+				if activity > rhs + 1e-6:
+					violated.append((family, n))
+		return violated
+
+	def enforce(self):
+		violated = self.get_violated()
+		if violated == []:
+			return {"result":SCIP_RESULT.FEASIBLE}
+		for family, n in violated:
+			terms, rhs = self.rows[family][n]
+			self.model.addCons(quicksum(coef*var for var, coef in terms) <= rhs)
+			self.in_model.add((family, n))
+			self.added[family] = self.added.get(family, 0) + 1
+		return {"result":SCIP_RESULT.CONSADDED}
+
+	def consenfolp(self, constraints, nusefulconss, solinfeasible):
+		return self.enforce()
+
+	def consenfops(self, constraints, nusefulconss, solinfeasible, objinfeasible):
+		return self.enforce()
+
+	def conscheck(self, constraints, solution, checkintegrality, checklprows,
+			printreason, completely):
+		if self.get_violated(solution) != []:
+			return {"result":SCIP_RESULT.INFEASIBLE}
+		return {"result":SCIP_RESULT.FEASIBLE}
+
+	def conslock(self, constraint, locktype, nlockspos, nlocksneg):
+		# (the coefficients are all positive, so only rounding up can
+		# violate a row)
+		transformed = self.model.getStage() != SCIP_STAGE.PROBLEM
+		for family in self.rows:
+			for terms, rhs in self.rows[family]:
+				for var, coef in terms:
+					if transformed:
+						var = self.model.getTransformedVar(var)
+					self.model.addVarLocksType(var, locktype, nlocksneg, nlockspos)
+
+
+class InputError(ValueError):
+	"""
+	Raised by `Optimizer` when `screen_inputs` (or `set_proximity`) finds
+	inputs that can't give a schedule, `problems` holds what it found
+	"""
+	def __init__(self, problems):
+		self.problems = problems
+		ValueError.__init__(self, "\n".join(p["message"] for p in problems))
+
 
 class Optimizer():
 	"""
@@ -60,15 +229,22 @@ class Optimizer():
 	prox_dict - dictionary of proximities subject --> list of flags, where
 				the index of the flag corrsponds to the course
 				gets a 1 if it is in that subject
+				(the rows of prox_matrix, subject x course)
+	prox_courses - dictionary subject --> array of the course indicies
+				   with a non-zero flag
 	multi_nested_list - list of lists, where each sub list is the courses that 
 						are the same in multi-instance sense
 	Ta - matrix of teachers and courses, gets a flag (1) if teacher is teaching
 		that course. Teachers are rows, and courses are columns
 	I_C_dict - dictionary of teacher name --> list of courses they teach
+	I_course_index - dictionary of teacher index (row of Ta) --> list of 
+					indicies of the courses they teach
 	R - list of rooms
 	room_constrained_subjects - list of subjects that have room type constraints
 	constrained_rooms - dictionary subject --> rooms that are OK for that sub
 	constrained_courses - dictinoary subject --> courses constrained by that sub
+	S_C_dict - dictionary student --> courses they are eligible for (have variables)
+	C_S_dict - dictionary course --> students eligible for that course
 
 	Main Methods
 	------------
@@ -91,7 +267,20 @@ class Optimizer():
 				rr_df = None,
 				save_location=None,
 				requirements = [],
-				prox=None, ):
+				prox=None,
+				sparse=False,
+				rooms_post_solve=False,
+				linking="student",
+				alias_doubles=False,
+				fix_bounds=False,
+				student_types=False,
+				symmetry=None,
+				profile=False,
+				cache_dir=None,
+				progress=None,
+				checkpoint_interval=None,
+				lazy=False,
+				seniority=None):
 		"""
 		Sets up main fields, and calls other methods to parse data into required
 		sets
@@ -123,6 +312,68 @@ class Optimizer():
 		Requirements - List of requirement objects that were solicited from the user
 					   these are then iterated over, parsed, and coded)
 
+		sparse	- if True only create X/U variables for the (student, course)
+				  pairs that can actually occur (see `set_eligibility`),
+				  otherwise every student is eligible for every course
+
+		rooms_post_solve - if True the ILP has no room variables, only a
+				  capacity by room type constraint each period, and rooms
+				  are matched to courses after the solve (see `match_rooms`)
+
+		linking - how U is tied to the Course variable, "student" adds
+				  Course[j,t] >= U[i,j,t] for every student, "aggregate" adds
+				  one sum_i U[i,j,t] <= MAX[j]*Course[j,t] per course/period
+
+		alias_doubles - if True the second half of a double period has no
+				  variables of its own, it reads the first half's variables
+				  (one period earlier), and invalid start periods are fixed
+				  at 0 instead of being created (see `get_double_alias`)
+
+		fix_bounds - if True the single variable constraints (resource rooms,
+				  special room exclusions, `Other` period locks) are not
+				  added as rows, variables fixed at 0 are never created and
+				  the ones fixed at 1 get bounds instead (see `set_fixings`)
+
+		student_types - if True identical students (same preferences, grade
+				  and resource room) are one type, X/U count the students of
+				  each type and are split back into schedules after the solve
+				  (see `set_student_types` and `split_type`)
+
+		symmetry - SCIP's symmetry handling (`misc/usesymmetry`), 0 turns it
+				  off, None leaves SCIP's default (see also
+				  `add_symmetry_constraints`)
+
+		profile - if True `build_report` also gets the non-zeros and peak
+				  Python memory of each phase (tracemalloc slows the build
+				  down), and it is saved to `save_location` after each one
+				  (see `phase` and `save_build_report`)
+
+		cache_dir - directory for built models, if a model was built from
+				  the same inputs and options it is read from there instead
+				  of being built (`build` then skips the `add_*` calls and
+				  only sets the GAP), otherwise `build` saves the model there
+				  once it is built, before any warm start, repair or other
+				  bounds (see `get_cache_key`)
+
+		progress - function called with a dictionary of the primal and dual
+				  bound, gap, seconds and number of solutions on every new
+				  best solution during `optimize` (see `Progress`)
+
+		checkpoint_interval - if given, the best solution is saved to
+				  `save_location` during `optimize` (on a new best solution,
+				  at most once per this many seconds), so an interrupted run
+				  can be warm started from it (see `save_checkpoint`)
+
+		lazy	- if True the proximity and teacher rows are not added to
+				  the model, a constraint handler checks the solutions
+				  against them and only adds the ones that are violated (see
+				  `LazyRows` and `get_lazy_report`). The model is then not
+				  cached, and can't be used by `portfolio`
+
+		seniority - dictionary grade --> multiplier of the students' scores
+				  in the objective, for the grades that should not get the
+				  default one (see `get_seniority`)
+
 		"""
 
 		# Initialze Fields
@@ -138,15 +389,26 @@ class Optimizer():
 		self.MIN = None
 		self.MAX = None
 		self.prox_dict = None
+		self.prox_matrix = None
+		self.prox_subjects = None
+		self.prox_courses = None
 		self.multi_nested_list = None
 		self.Ta = None
 		self.I_C_dict = None
+		self.I_course_index = None
 		self.R = None
 		self.room_constrained_subjects = None
 		self.constrained_rooms = None
 		self.constrained_courses = None
 		self.RR_course_indicies = None # for the courses
 		self.RR_student_dict = None # dictionary mapping RR to list of student indicies
+		self.S_C_dict = None # student --> list of courses they are eligible for
+		self.C_S_dict = None # course --> list of students eligible for it
+		self.fixed = None # "X"/"Course"/"U"/"Rv" --> {key:value} fixed variables
+		self.all_S = None # every student (S only has one per type)
+		self.type_members = None # student --> students of their type
+		self.type_size = None # student --> number of students of their type
+		self.input_problems = [] # what `screen_inputs` found
 
 		self.student_dict = student_dict
 		self.num_courses = num_courses
@@ -159,6 +421,29 @@ class Optimizer():
 		self.num_vars = 0
 		self.num_cons = 0
 
+		# one record per phase (see `phase`)
+		self.build_report = []
+		self.profile = profile
+
+		# model cache
+		self.cache_dir = cache_dir
+		self.from_cache = False # True if the model was read from cache_dir
+		self.model_calls = [] # the add_* and set_objective calls made
+		if self.profile and not tracemalloc.is_tracing():
+			tracemalloc.start()
+
+		# progress of the solve (see `Progress`)
+		self.progress = progress
+		self.checkpoint_interval = checkpoint_interval
+		self.progress_log = []
+		self.progress_handler = None
+
+		# rows left to the constraint handler (see `add_row`)
+		self.lazy = lazy
+		self.lazy_handler = None
+
+		# grade --> objective multiplier, over the defaults
+		self.seniority = seniority
 
 		# main LP_input
 		self.df = LP_input
@@ -169,6 +454,13 @@ class Optimizer():
 		self.requirements = requirements
 		self.rr_df = rr_df # The dataframe with columns for rr's with student id's
 		self.save_location = save_location
+		self.sparse = sparse
+		self.rooms_post_solve = rooms_post_solve
+		self.linking = linking
+		self.alias_doubles = alias_doubles
+		self.fix_bounds = fix_bounds
+		self.student_types = student_types
+		self.symmetry = symmetry
 
 		# Clean up preferences (at least in current form)
 		self.prefs = prefs.rename(columns={"Unnamed: 0": "Student"})
@@ -182,6 +474,9 @@ class Optimizer():
 		# Pull sets
 		self.pull_sets()
 
+		# Group identical students (S becomes one student per type)
+		self.set_student_types()
+
 		# get multi-instance course list from main LP input
 		self.get_multi_instance_course_list() # sets `multi_nested_list`
 
@@ -191,16 +486,29 @@ class Optimizer():
 		# Get room data
 		self.set_room_data()
 
+		# Check for inputs that can't give a schedule before building
+		self.input_problems = self.screen_inputs()
+		fatal = [problem for problem in self.input_problems if problem["fatal"]]
+		if fatal != []:
+			raise InputError(fatal)
+
+		# Determine which (student, course) pairs get variables
+		self.set_eligibility()
+
+		# Collect the variables that are fixed by the data
+		self.set_fixings()
+
 		# Create model
-		self.m = Model()
+		self.m = self.create_model()
 
 		# Quick shortening to see if it works?
 		#self.S = self.S[-10:]
 		#self.S = self.S[-140:]
 
-		# Add Variables
-		print("Adding Variables")
-		self.add_variables()
+		# Add Variables (or read the whole model, if it was built before)
+		if not self.load_model():
+			print("Adding Variables")
+			self.add_variables()
 
 		# # Add constraints
 		# print("Adding Constraints")
@@ -220,7 +528,35 @@ class Optimizer():
 
 
 
-
+	def build(self, calls):
+		"""
+		Adds the constraints and objective to the model, `calls` is the
+		list of builder methods to call in order, by name or as (name,
+		arguments), e.g.
+			["add_basic_constraints", ("add_symmetry_constraints", "period"),
+			 "set_objective"]
+		A model read from `cache_dir` already has them, then only the GAP
+		is set. The calls are kept in `model_calls` (and with the cached
+		model), so a cached model is only used with the same ones (see
+		`check_model_calls`). A model that is built is saved to `cache_dir`
+		here, so nothing set on it afterwards (`warm_start`, `repair`,
+		`decompose` fixings) ends up in the cache. Builders called on their
+		own are not cache aware, use `build` whenever `cache_dir` is given
+		"""
+		for call in calls:
+			name, args = (call, ()) if isinstance(call, str) else \
+				(call[0], tuple(call[1:]))
+			self.model_calls.append(name + str(args) + "[]")
+			if not self.from_cache:
+				getattr(self, name)(*args)
+		if self.from_cache:
+			print("Constraints and objective read with the model")
+			self.set_gap()
+		elif self.cache_dir is not None:
+			self.save_model()
+
+
+	@phase
 	def pull_sets(self):
 		"""
 		Pulls the sets:
@@ -236,6 +572,7 @@ class Optimizer():
 			MIN - Min course sizes
 			MAX - Max Course sizes
 			prox_dict - prodimity dictionary for courses in same subject
+						(see `set_proximity`)
 
 		Saves them in the appropriate fields
 		"""
@@ -308,10 +645,7 @@ class Optimizer():
 		self.D = self.prox.as_matrix()
 
 		# Create Proximity dictionary {subject:proximity vector}
-		self.prox_dict = {}
-		Subjects = list(self.prox.columns)[1:]
-		for subj in list(self.prox.columns)[1:]:
-			self.prox_dict[subj] = self.prox[subj]
+		self.set_proximity()
 
 		# Get course indicies for the RR's
 		# self.RR_course_indicies = []
@@ -349,6 +683,80 @@ class Optimizer():
 
 
 
+	def set_proximity(self):
+		"""
+		Lines the proximity data up with Cd by course name, as a NumPy
+		matrix subject x course (prox_matrix, rows in the order of
+		prox_subjects), with prox_dict holding its rows and prox_courses
+		the non-zero course indicies of each subject
+
+		The course names are the `Course Name` column (as in Proximity.csv)
+		or the index (as `clean_data.dept_proximity` makes it). Missing
+		RR rows are 0's (older data was made before the RR's), any other
+		course without a row (or with more than one) raises an InputError
+		before the build
+		"""
+		prox = self.prox
+		if "Course Name" in prox.columns:
+			prox = prox.set_index("Course Name")
+		problems = []
+		duplicated = sorted(set(prox.index[prox.index.duplicated()]))
+		if duplicated != []:
+			problems.append({"check":"proximity", "fatal":True,
+				"message":"Courses with more than one proximity row: " +
+				", ".join(str(name) for name in duplicated)})
+		missing = [self.Cd[j] for j in self.C if self.Cd[j] not in prox.index
+			and self.Cd[j] not in ["RR1", "RR2", "RR3"]]
+		if missing != []:
+			problems.append({"check":"proximity", "fatal":True,
+				"message":"Courses without a proximity row: " + ", ".join(missing)})
+		if problems != []:
+			raise InputError(problems)
+
+		names = [self.Cd[j] for j in self.C]
+		prox = prox.reindex(names).fillna(0)
+		self.prox_subjects = list(prox.columns)
+		self.prox_matrix = prox.to_numpy(dtype=float).T
+
+		self.prox_dict = {}
+		self.prox_courses = {}
+		for row, subject in enumerate(self.prox_subjects):
+			self.prox_dict[subject] = self.prox_matrix[row]
+			self.prox_courses[subject] = np.nonzero(self.prox_matrix[row])[0]
+
+	@phase
+	def set_student_types(self):
+		"""
+		Groups the students that look the same to the model, same preference
+		row, grade and resource room (requirements go by grade), only if
+		`student_types`, otherwise every student is their own type
+			all_S - all of the students
+			type_members - first student of a type --> students of the type
+			type_size - first student of a type --> number in the type
+		S is set to the first student of each type, and their X/U variables
+		are integers counting the students of the type
+		"""
+		self.all_S = self.S
+		types = {}
+		for i in self.S:
+			if not self.student_types:
+				types[i] = [i]
+				continue
+			rr = tuple(i in self.RR_student_dict[r] for r in ["RR1", "RR2", "RR3"])
+			key = (tuple(self.P[i]), self.student_dict[i].grade, rr)
+			types[key] = types.get(key, []) + [i]
+
+		self.type_members = {}
+		for members in types.values():
+			self.type_members[members[0]] = members
+		self.S = sorted(self.type_members.keys())
+		self.type_size = {i:len(self.type_members[i]) for i in self.S}
+
+		if self.student_types:
+			print("\t", len(self.all_S), "students in", len(self.S), "types")
+
+
+	@phase
 	def get_multi_instance_course_list(self):
 		"""
 		sets the `multi_nested_list` field, determining which courses have multiple
@@ -387,42 +795,44 @@ class Optimizer():
 		self.multi_nested_list = multi_nested_list
 
 
+	@phase
 	def map_teachers(self):
 		"""
 		Maps teachers to their courses, 
 		creates the fields
 			I_C_dict - dictinoary style mapping
+			I_course_index - teacher index --> course indicies
 			Ta - matrix flag style mapping
 		"""
-		# Need matrix with instructors as rows, all courses as columns, and 1 if teaching that course
+		# teacher --> course names, one pass over the teacher file
+		# (teachers without a name keep an empty list)
 		I_C_dict = {}
 		for i in self.I:
 			I_C_dict[i] = []
-			for index in range(self.teacher.shape[0]):
-				if self.teacher.iloc[index]["Teacher Name"] == i:
-					l = I_C_dict[i]
-					#l.append(self.teacher.iloc[index][1])
-					l.append(self.teacher.iloc[index]["Course Name"])
-					I_C_dict[i] = l
-
+		for i, courses in self.teacher.groupby("Teacher Name")["Course Name"]:
+			I_C_dict[i] = list(courses)
 
-		# Teacher_Course_Matrix 
-		courses_list = list(self.Cd.values())
-		Teacher_Course_Matrix = np.zeros(len(courses_list))
-		for i in self.I:
-			t = np.zeros(len(courses_list))
-			for j in self.Cd:
-				if self.Cd[j] in I_C_dict[i]:
-					# print(i, "is teaching:", (40-len(i)-12)*".", Cd[j])
-					t[j] =1
-			Teacher_Course_Matrix = np.vstack([Teacher_Course_Matrix, np.matrix(t)])
+		# course name --> indicies with that name
+		name_index = {}
+		for j in self.Cd:
+			name_index[self.Cd[j]] = name_index.get(self.Cd[j], []) + [j]
 
-		Ta = np.array(Teacher_Course_Matrix[1:]) # matrix tying teachers to courses they teach
+		# Need matrix with instructors as rows, all courses as columns, and 1 if teaching that course
+		I_course_index = {}
+		Ta = np.zeros((len(self.I), len(self.Cd))) # matrix tying teachers to courses they teach
+		for k in range(len(self.I)):
+			courses = set()
+			for name in I_C_dict[self.I[k]]:
+				courses.update(name_index.get(name, []))
+			I_course_index[k] = sorted(courses)
+			Ta[k, I_course_index[k]] = 1
 
 		# Save fields
 		self.Ta = Ta
 		self.I_C_dict = I_C_dict
+		self.I_course_index = I_course_index
 
+	@phase
 	def set_room_data(self):
 		"""
 		Sets up the room data, 
@@ -467,6 +877,328 @@ class Optimizer():
 		self.constrained_courses = constrained_courses
 
 
+	def get_requirement_courses(self, req):
+		"""
+		Takes in a Requirement and returns the list of course indicies
+		that satisfy it (both OR courses, and all of their multi-instance
+		sections)
+		"""
+		# Get list of course names to find index later
+		l = list(self.Cd.values())
+
+		# get indicies for courses:
+		index1 = l.index(req.course1)
+		if req.course2 is not None:
+			index2 = l.index(req.course2)
+		else:
+			index2 = None
+
+		# determine if multi-index course
+		multi_1 = [index1] #<-- therefore can use even if not multi later
+		if index2 is not None:
+			multi_2 = [index2]
+		for m in self.multi_nested_list:
+			if index1 in m:
+				multi_1 = m # <-- contains list of indicies that also qualify
+			if (index2 is not None) and (index2 in m):
+				multi_2 = m
+
+		# Combine the two index lists (if there are two)
+		if index2 is not None:
+			multi = multi_1 + multi_2
+		else:
+			multi = multi_1
+
+		return multi
+
+
+	@phase
+	def screen_inputs(self):
+		"""
+		Looks for inputs that can't give a schedule, in milliseconds and
+		before anything is built (`__init__` raises an InputError with
+		the fatal ones). Returns a list of dictionaries with the "check"
+		that failed, whether it is "fatal" and a "message" for the user:
+			requirement - a requirement course is not in the LP input
+			requirement capacity - the MAX of a grade's requirement courses
+								   adds up to less than the students in it
+			teacher - a teacher has more courses than there are periods
+			room - the courses that can only use a room type don't fit in
+				   its rooms over all the periods
+			double period - a double period without its second half, or no
+							period it could start in
+			resource room - a student id in the RR file that is not one of
+							the students (not fatal, they are left out of
+							the resource rooms as before)
+		"""
+		problems = []
+		names = list(self.Cd.values())
+
+		for req in (self.requirements or []):
+			missing = [name for name in [req.course1, req.course2]
+				if name is not None and name not in names]
+			if missing != []:
+				problems.append({"check":"requirement", "fatal":True,
+					"message":"The grade " + str(req.grade) + " requirement course " +
+					" and ".join(missing) + " is not in the LP input"})
+				continue
+			students = [i for i in self.all_S if self.student_dict[i].grade == req.grade]
+			capacity = np.nansum([self.MAX[j] if not np.isnan(self.MAX[j]) else np.inf
+				for j in self.get_requirement_courses(req)])
+			if capacity < len(students):
+				problems.append({"check":"requirement capacity", "fatal":True,
+					"message":"The grade " + str(req.grade) + " requirement (" +
+					" or ".join(str(name) for name in [req.course1, req.course2]
+					if name is not None) + ") has room for " + str(int(capacity)) +
+					" of its " + str(len(students)) + " students"})
+
+		for k in range(len(self.I)):
+			courses = self.I_course_index[k]
+			if len(courses) > len(self.T):
+				problems.append({"check":"teacher", "fatal":True,
+					"message":str(self.I[k]) + " teaches " + str(len(courses)) +
+					" course periods, there are " + str(len(self.T)) + " periods"})
+
+		for A, courses in self.get_room_type_sets():
+			if len(courses) > len(A)*len(self.T):
+				problems.append({"check":"room", "fatal":True,
+					"message":str(len(courses)) + " course periods can only use " +
+					", ".join(sorted(A)) + " (" + str(len(A)*len(self.T)) +
+					" room periods)"})
+
+		starts = [t for t in self.T if t != 4 and t != 8 and t+1 in self.T]
+		for j in self.C:
+			if self.Db[j] != 1:
+				continue
+			if j+1 not in self.Cd or self.Db[j+1] == 1:
+				problems.append({"check":"double period", "fatal":True,
+					"message":self.Cd[j] + " is a double period without a second " +
+					"half after it in the LP input"})
+			elif starts == []:
+				problems.append({"check":"double period", "fatal":True,
+					"message":self.Cd[j] + " has no two periods in a row to start in"})
+
+		ids = set()
+		for i in self.all_S:
+			if not np.isnan(self.student_dict[i].s_id):
+				ids.add(int(self.student_dict[i].s_id))
+		for name in ["RR1", "RR2", "RR3"]:
+			for v in self.rr_df[name]:
+				if not np.isnan(v) and int(v) not in ids:
+					problems.append({"check":"resource room", "fatal":False,
+						"message":"Student id " + str(int(v)) + " in " + name +
+						" is not one of the students"})
+
+		for problem in problems:
+			print("\t" + problem["message"])
+		return problems
+
+
+	@phase
+	def set_eligibility(self):
+		"""
+		Determines which courses each student could possibly be placed in,
+		X and U variables are only created for these pairs
+			S_C_dict - student --> sorted list of eligible course indicies
+			C_S_dict - course --> list of eligible student indicies
+
+		If `sparse` is False every student is eligible for every course
+		(the original dense model), otherwise a student is eligible for:
+			courses they ranked in their preferences
+			requirement courses for their grade
+			their resource room (if they are in `RR_student_dict`)
+			`Other` courses (the fallbacks)
+		and then the other sections of any eligible multi-instance course,
+		and both halves of any eligible double period
+		"""
+		S_C_dict = {}
+		if not self.sparse:
+			for i in self.S:
+				S_C_dict[i] = list(self.C)
+		else:
+			# requirement courses by grade
+			req_courses = {}
+			for req in self.requirements:
+				l = req_courses.get(req.grade, [])
+				req_courses[req.grade] = l + self.get_requirement_courses(req)
+
+			for i in self.S:
+				eligible = set(np.nonzero(self.P[i] > 0)[0])
+				eligible.update(req_courses.get(self.student_dict[i].grade, []))
+				eligible.update(self.other_indicies)
+				for name in ["RR1", "RR2", "RR3"]:
+					if i in self.RR_student_dict[name]:
+						eligible.add(self.RR_course_indicies[name])
+
+				# all sections of multi-instance courses are interchangeable
+				# (multi_nested_list only holds the first half of doubles)
+				self.add_double_halves(eligible)
+				for course_set in self.multi_nested_list:
+					if eligible.intersection(course_set):
+						eligible.update(course_set)
+				self.add_double_halves(eligible)
+
+				S_C_dict[i] = sorted(int(j) for j in eligible)
+
+		C_S_dict = {}
+		for j in self.C:
+			C_S_dict[j] = []
+		for i in self.S:
+			for j in S_C_dict[i]:
+				C_S_dict[j].append(i)
+
+		self.S_C_dict = S_C_dict
+		self.C_S_dict = C_S_dict
+
+		n_pairs = sum(len(S_C_dict[i]) for i in self.S)
+		print("\t", n_pairs, "of", len(self.S)*len(self.C),
+			"student/course pairs are eligible")
+
+
+	@phase
+	def set_fixings(self):
+		"""
+		Collects the variables fixed by single variable constraints into
+		`fixed` (only if `fix_bounds`, otherwise they stay constraints):
+			RR students are in their resource room (X == 1), everyone
+			else is removed from the RR courses in S_C_dict/C_S_dict
+			Art/Music/Gym/Resource rooms only hold their own courses
+			(Rv == 0 for every other course)
+		`add_variables` skips the 0's and puts bounds on the 1's (all of a
+		type for student types), and
+		`add_rr_constraints`/`add_room_constraints` then skip those rows.
+		(The `Other` period locks are set as bounds by `add_period_constraints`
+		since that one is optional)
+		"""
+		fixed = {"X":{}, "Course":{}, "U":{}, "Rv":{}}
+		self.fixed = fixed
+		if not self.fix_bounds:
+			return
+
+		# Resource rooms
+		n_removed = 0
+		for r in ["RR1", "RR2", "RR3"]:
+			students = self.RR_student_dict[r]
+			course = self.RR_course_indicies[r]
+			for i in self.S:
+				if i in students:
+					fixed["X"][i,course] = 1
+				elif course in self.S_C_dict[i]:
+					self.S_C_dict[i].remove(course)
+					self.C_S_dict[course].remove(i)
+					n_removed += 1
+
+		# Special rooms
+		for subject in ['Art', 'Music', 'Gym', "Resource"]:
+			sub_courses = set(self.constrained_courses[subject])
+			for j in set(self.c_mini) - sub_courses:
+				for s in self.constrained_rooms[subject]:
+					for t in self.T:
+						fixed["Rv"][j,s,t] = 0
+
+		n_rows = len(fixed["X"]) + n_removed
+		n_vars = n_removed*(1 + len(self.T)) # X and its U's
+		if not self.rooms_post_solve:
+			n_rows += len(fixed["Rv"])
+			n_vars += len(fixed["Rv"])
+		print("\t", n_rows, "single variable rows removed,", n_vars,
+			"variables not created,", len(fixed["X"]), "fixed by bounds")
+
+	def is_constant(self, var):
+		"""
+		True if `var` was never created (fixed or aliased to a constant)
+		"""
+		return isinstance(var, (int, float))
+
+	def new_variable(self, kind, key, name, ub=1):
+		"""
+		Returns a new binary variable (integer from 0 to `ub` if ub > 1, for
+		student types), or its value if it is fixed at 0 in `fixed[kind]`
+		(fixed at 1 gets lb = ub instead)
+		"""
+		value = self.fixed[kind].get(key)
+		if value == 0:
+			return 0
+		self.num_vars += 1
+		vtype = "B" if ub == 1 else "I"
+		if value == 1:
+			return self.m.addVar(vtype=vtype, name=name, lb=ub, ub=ub)
+		return self.m.addVar(vtype=vtype, name=name, ub=ub)
+
+	def add_row(self, family, terms, rhs):
+		"""
+		Adds the row sum(coef*var) <= rhs over the (var, coef) pairs in
+		`terms` to the model, or if `lazy` leaves it to the `LazyRows`
+		handler under `family` (the handler is added with the first one)
+		"""
+		if not self.lazy:
+			self.m.addCons(quicksum(coef*var for var, coef in terms) <= rhs)
+			self.num_cons += 1
+			return
+		if self.lazy_handler is None:
+			self.lazy_handler = LazyRows()
+			# after the integrality, so it only sees integer solutions
+			self.m.includeConshdlr(self.lazy_handler, "lazy",
+				"rows left out of the model until they are violated",
+				enfopriority=-1, chckpriority=-1, needscons=True)
+			# (one constraint, to get the variable locks)
+			self.m.addPyCons(self.m.createCons(self.lazy_handler, "lazy rows",
+				initial=False, separate=False, propagate=False))
+		self.lazy_handler.rows.setdefault(family, []).append((terms, rhs))
+
+	def get_lazy_report(self):
+		"""
+		Returns a dictionary family --> (rows added in the last solve,
+		rows left out) of the `lazy` rows
+		"""
+		if self.lazy_handler is None:
+			return {}
+		report = {}
+		for family, rows in self.lazy_handler.rows.items():
+			report[family] = (self.lazy_handler.added.get(family, 0), len(rows))
+		return report
+
+	def add_double_halves(self, courses):
+		"""
+		Takes in a set of course indicies and adds (in place) the other half
+		of any double period course in it
+		"""
+		for j in list(courses):
+			if self.Db[j] == 1:
+				courses.add(j+1)
+			elif j > 0 and self.Db[j-1] == 1:
+				courses.add(j-1)
+
+
+	def get_double_alias(self, course, period):
+		"""
+		Returns the (course, period) whose variables are used for `course`
+		in `period`, or None if it can never be taught then. Only differs
+		from (course, period) when `alias_doubles`:
+			first half of a double - None in 4th and 8th
+			second half of a double - the first half one period earlier
+									  (None in 1st and 7th)
+		"""
+		if not self.alias_doubles:
+			return course, period
+		if self.Db[course] == 1:
+			if period != 4 and period != 8:
+				return course, period
+			return None
+		if self.is_second_half(course):
+			if period-1 in self.T and period-1 != 4 and period-1 != 8:
+				return course-1, period-1
+			return None
+		return course, period
+
+	def is_second_half(self, course):
+		"""
+		True if `course` is the second half (the " II" row) of a double 
+		period that is being aliased to its first half
+		"""
+		return self.alias_doubles and course > 0 and self.Db[course-1] == 1
+
+	@phase
 	def add_variables(self):
 		"""
 		Adds the model variables:
@@ -476,47 +1208,72 @@ class Optimizer():
 			Rv[course, room, period] - Room var
 		"""
 		# Add Student Variables (X)
+		# only for the courses each student is eligible for
 		X = {}
 		for i in self.S:
-			for j in range(len(self.C)):
+			for j in self.S_C_dict[i]:
+				if self.is_second_half(j):
+					X[i,j] = X[i,j-1] # student in both halves
+					continue
 				name = "Student " + str(i) + " in course " + str(j)
 				# X[i,j] = m.addVar(vtype=GRB.BINARY, name=name)
-				X[i,j] = self.m.addVar(vtype="B", name=name)
-				self.num_vars += 1
+				X[i,j] = self.new_variable("X", (i,j), name, ub=self.type_size[i])
 		print("\tStudent/Course variable added")
 
 		# Add Course Variable
 		Course = {} # Variable dictionary
 		for j in range(len(self.C)):
 			for t in self.T:
+				alias = self.get_double_alias(j, t)
+				if alias is None:
+					Course[j,t] = 0
+					continue
+				if alias != (j, t):
+					Course[j,t] = Course[alias]
+					continue
 				name = "Course " + str(j) + " in period " + str(t)
 				# Course[j,t] = m.addVar(vtype=GRB.BINARY, name=name)
-				Course[j,t] = self.m.addVar(vtype="B", name=name)
-				self.num_vars += 1
+				Course[j,t] = self.new_variable("Course", (j,t), name)
 		print("\tCourse/Period variable added")
 
 		# Create the u variable
 		U = {}
 		for i in self.S:
-			for j in range(len(self.C)):
+			for j in self.S_C_dict[i]:
 				for t in self.T:
+					alias = self.get_double_alias(j, t)
+					if alias is None or self.is_constant(Course[j,t]):
+						U[i,j,t] = 0 # course can't be taught then
+						continue
+					if alias != (j, t):
+						U[i,j,t] = U[(i,) + alias]
+						continue
 					name = "min " + str(i) + ", " + str(j) + ", " + str(t)
 					# U[i,j,t] = m.addVar(vtype=GRB.BINARY, name=name)
-					U[i,j,t] = self.m.addVar(vtype="B", name=name)
-					self.num_vars += 1
+					U[i,j,t] = self.new_variable("U", (i,j,t), name,
+						ub=self.type_size[i])
 		print("\tU(Student/Course/Period) variable added")
 
 		# Define r  room variable (over course j in room r durring period t)
+		# (not needed if rooms are assigned after the solve)
 		Rv = {}
 		for j in range(len(self.C)):
+			if self.rooms_post_solve:
+				break
 			if "Other" not in self.Cd[j] and "Empty" not in self.Cd[j]:
 				for s in self.R:
 					for t in self.T:
+						alias = self.get_double_alias(j, t)
+						if alias is None:
+							Rv[j,s,t] = 0
+							continue
+						if alias != (j, t):
+							Rv[j,s,t] = Rv[alias[0], s, alias[1]]
+							continue
 						name = "Course " + str(j) + " in room " + str(s) + \
 								" durring period " + str(t)
 						# Rv[j,s,t] = m.addVar(vtype=GRB.BINARY, name=name)
-						Rv[j,s,t] = self.m.addVar(vtype="B", name=name)
-						self.num_vars += 1
+						Rv[j,s,t] = self.new_variable("Rv", (j,s,t), name)
 		print("\tRoom/Period Variables added")
 
 		# Save to class
@@ -526,6 +1283,7 @@ class Optimizer():
 		self.Rv = Rv
 
 
+	@phase
 	def add_basic_constraints(self):
 		"""
 		Adds the basic constraints to the model:
@@ -537,7 +1295,8 @@ class Optimizer():
 		for i in self.S:
 			for t in self.T:
 				# m.addConstr(quicksum(U[i,j,t] for j in C) == 1) # one course per period
-				self.m.addCons(quicksum(self.U[i,j,t] for j in self.C) == 1) # one course per period
+				self.m.addCons(quicksum(self.U[i,j,t] for j in self.S_C_dict[i])
+					== self.type_size[i]) # one course per period (for each of the type)
 				self.num_cons += 1
 		print("\tOne course per period")
 
@@ -545,37 +1304,75 @@ class Optimizer():
 		# "AND" Constraint--no more than one course per period for a student
 		# Enforces the definition of the U variable
 		for i in self.S:
-			for j in self.C:
+			for j in self.S_C_dict[i]:
+				if self.is_second_half(j):
+					continue # same variables as the first half
 				# m.addConstr(X[i,j] == quicksum(U[i,j,t] for t in T))
 				self.m.addCons(self.X[i,j] == quicksum(self.U[i,j,t] for t in self.T))
 				self.num_cons += 1
+				if self.linking == "aggregate":
+					continue
 				for t in self.T:
+					if self.is_constant(self.U[i,j,t]):
+						continue # fixed at 0
 					# m.addConstr(Course[j,t] >= U[i,j,t])
-					self.m.addCons(self.Course[j,t] >= self.U[i,j,t])
+					self.m.addCons(self.type_size[i]*self.Course[j,t] >= self.U[i,j,t])
+					self.num_cons += 1
+
+		# Aggregated version, only |C|*|T| constraints
+		if self.linking == "aggregate":
+			for j in self.C:
+				if self.C_S_dict[j] == [] or self.is_second_half(j):
+					continue
+				big_m = self.get_linking_coefficient(j)
+				for t in self.T:
+					if self.is_constant(self.Course[j,t]):
+						continue
+					self.m.addCons(quicksum(self.U[i,j,t] for i in self.C_S_dict[j])
+						<= big_m*self.Course[j,t])
 					self.num_cons += 1
 		print("\tU set-up constraints (`and`) added")
 
 
+	def get_linking_coefficient(self, course):
+		"""
+		Returns the coefficient on Course[j,t] in the aggregate linking
+		constraint, MAX[j] (capped at the number of eligible students, and
+		used on its own when there is no MAX, e.g. for the RR's)
+		"""
+		n = sum(self.type_size[i] for i in self.C_S_dict[course])
+		if np.isnan(self.MAX[course]):
+			return n
+		return min(self.MAX[course], n)
+
+
+	@phase
 	def add_max_constraint(self):
 		"""
 		Adds max capacity constraint
 		"""
 		for j in range(len(self.C)):
-			self.m.addCons(quicksum(self.X[i,j] for i in self.S) <= self.MAX[j])
+			if self.C_S_dict[j] == [] or np.isnan(self.MAX[j]):
+				continue # no student can take it, or no cap given (the RR's)
+			self.m.addCons(quicksum(self.X[i,j] for i in self.C_S_dict[j]) <= self.MAX[j])
 			self.num_cons += 1
 		print("\tMax course capacity")
 
 
+	@phase
 	def add_min_constraint(self):
 		"""
 		Adds min capacity constraint
 		"""
 		for j in range(len(self.C)):
-			self.m.addCons(quicksum(self.X[i,j] for i in self.S) >= self.MIN[j])
+			if self.C_S_dict[j] == [] or np.isnan(self.MIN[j]):
+				continue # no student can take it, or no minimum given
+			self.m.addCons(quicksum(self.X[i,j] for i in self.C_S_dict[j]) >= self.MIN[j])
 			self.num_cons += 1
 		print("\tMin capacity constraint")
 
 
+	@phase
 	def add_proximity_constraints(self):
 		"""
 		Adds the proximity constraints
@@ -600,12 +1397,29 @@ class Optimizer():
 		# 			self.m.addCons(quicksum(self.prox_dict[subject][j]*self.X[i,j]
 		# 						 for j in self.C) <= max_sub_dict[subject][i])
 
+		# eligibility as a student x course matrix, to count each
+		# student's courses in a subject at once
+		eligible = np.zeros((len(self.P), len(self.C)), dtype=bool)
+		for i in self.S:
+			eligible[i, self.S_C_dict[i]] = True
+
 		for subject in self.num_courses.keys():
 			#if (subject not in  ["Other", "J"] and (subject in self.num_courses.keys()) ):
-			if subject in self.num_courses.keys():
+			if subject in self.prox_dict:
 				print("\t\t", subject)
 				#d = self.num_courses[subject] # easy reference to list
+				# only the subject's courses (the non-zero flags, lined up
+				# with Cd by `set_proximity`), and only the students that
+				# could take more than 2 of them
+				coef = self.prox_dict[subject]
+				courses = self.prox_courses[subject]
+				total = eligible[:, courses] @ coef[courses]
+				# (plain Python numbers in the terms, NumPy scalars times
+				# SCIP variables are slow)
+				flags = list(zip(courses.tolist(), coef[courses].tolist()))
 				for i in self.S:
+					if total[i] <= 2:
+						continue
 					# Only add the minimum constraint if meaningful
 					#if d[i] > 0:
 					# make sure they don't request too many
@@ -621,13 +1435,10 @@ class Optimizer():
 					#					Come Back to This
 					#------------------------------------------------------
 					# This is pissy as prox not updated for new RR courses
-					# I will comment this out and try somethign else as a TEMP fix
-					try:
-						self.m.addCons(quicksum(self.prox_dict[subject][j]*self.X[i,j]
-							for j in self.C) <= 2) # was == but >= might be faster
-						self.num_cons += 1
-					except:
-						pass
+					# (the RR's are 0's now, see `set_proximity`)
+					self.add_row("proximity", [(self.X[i,j], flag) for (j, flag), e
+						in zip(flags, eligible[i, courses].tolist()) if e],
+						2*self.type_size[i]) # was == but >= might be faster
 
 					# mini = range(len(self.Cd)-3) # as there are 3 RR's
 					# self.m.addCons(quicksum(self.prox_dict[subject][j]*self.X[i,j]
@@ -638,21 +1449,33 @@ class Optimizer():
 
 
 
+	def get_proximity_coefficients(self, subject):
+		"""
+		Returns the proximity flags of `subject` (indexed by course), or
+		None if the proximity data has no column for it
+		"""
+		return self.prox_dict.get(subject)
+
+
+	@phase
 	def add_teacher_constraints(self):
 		"""
 		Adds the teacher constraints:
 			teacher teaches at most one course per period
 		"""
 		# Teacher teaching at most one course per period
+		# (only over the courses they teach, a single course can't clash)
 		for k in range(len(self.I)):
 			for t in self.T:
 				# m.addConstr(quicksum(Course[j,t]*Ta[k][j] for j in C) <= 1)
-				if np.sum(self.Ta[k]) > 0:
-					self.m.addCons(quicksum(self.Course[j,t]*self.Ta[k][j] for j in self.C) <= 1)
-					self.num_cons += 1
+				courses = [(self.Course[j,t], 1) for j in self.I_course_index[k]
+					if not self.is_constant(self.Course[j,t])]
+				if len(courses) > 1:
+					self.add_row("teacher", courses, 1)
 		print("\tTeacher teaches as most once per period")
 
 
+	@phase
 	def add_course_constraints(self):
 		"""
 		Adds the course constraints:
@@ -663,13 +1486,19 @@ class Optimizer():
 		"""
 		# Course Taught only once Constraint
 		for j in range(len(self.C)):
+			if self.is_second_half(j):
+				continue # same variables as the first half
 			# m.addConstr(quicksum(Course[j,t] for t in T) == 1)
 			self.m.addCons(quicksum(self.Course[j,t] for t in self.T) == 1)
 			self.num_cons += 1
 		print("\tCourse taught only once")
 
 		# Double period--consecutive constraints
+		# (all of the double period constraints hold by construction
+		# when the second half is aliased to the first)
 		for j in range(len(self.C)):
+			if self.alias_doubles:
+				break
 			if self.Db[j] == 1: # if double period
 				for t in self.T:
 					if t != 4 and t != 8:
@@ -681,6 +1510,8 @@ class Optimizer():
 
 		# Double Period--not 4th or 8th
 		for j in range(len(self.C)):
+			if self.alias_doubles:
+				break
 			if self.Db[j] == 1:
 				# m.addConstr(Course[j,4] == 0)
 				self.m.addCons(self.Course[j,4] == 0)
@@ -693,7 +1524,9 @@ class Optimizer():
 
 		# # Double Period--Student in both
 		for i in self.S:
-			for j in range(len(self.C)):
+			if self.alias_doubles:
+				break
+			for j in self.S_C_dict[i]:
 				if self.Db[j] == 1:
 					# m.addConstr(X[i,j+1] == X[i,j]) # this was >= but == is better?
 					self.m.addCons(self.X[i,j+1] == self.X[i,j]) # this was >= but == is better?
@@ -705,53 +1538,36 @@ class Optimizer():
 			for course_set in self.multi_nested_list:
 				# in at most one course of the list
 				# m.addConstr(quicksum(X[i,j] for j in course_set) <= 1)
-				self.m.addCons(quicksum(self.X[i,j] for j in course_set) <= 1)
+				if (i, course_set[0]) not in self.X:
+					continue # sections are eligible all together or not at all
+				self.m.addCons(quicksum(self.X[i,j] for j in course_set)
+					<= self.type_size[i])
 				self.num_cons += 1
 		print("\tStudents in at most of instance of multi-instance Course ")
 
 
 
+	@phase
 	def add_grade_level_requirements(self):
 		"""
 		Adds theg grade level requirements that are specified via the GUI
 		"""
-		# Get list of course names to find index later
-		l = list(self.Cd.values())
-
 		for req in self.requirements:
-			# get indicies for courses:
-			index1 = l.index(req.course1)
-			if req.course2 is not None:
-				index2 = l.index(req.course2)
-			else:
-				index2 = None
-
-			# determine if multi-index course
-			multi_1 = [index1] #<-- therefore can use even if not multi later
-			if index2 is not None:
-				multi_2 = [index2]
-			for m in self.multi_nested_list:
-				if index1 in m:
-					multi_1 = m # <-- contains list of indicies that also qualify
-				if (index2 is not None) and (index2 in m):
-					multi_2 = m
-
-			# Combine the two index lists (if there are two)
-			if index2 is not None:
-				multi = multi_1 + multi_2
-			else:
-				multi = multi_1
+			# courses (and their sections) that satisfy the requirement
+			multi = self.get_requirement_courses(req)
 
 			# Add constraint
 			for i in self.S:
 				#if self.Grades[i] == req.grade:
 				# New way of pulling grade out of dictinary
 				if self.student_dict[i].grade == req.grade:
-					self.m.addCons(quicksum(self.X[i,j] for j in multi) == 1)
+					self.m.addCons(quicksum(self.X[i,j] for j in multi) 
+						== self.type_size[i])
 					self.num_cons += 1
 
 
 
+	@phase
 	def add_room_constraints(self):
 		"""
 		Adds the room constraints:
@@ -759,13 +1575,21 @@ class Optimizer():
 			Room gets at most one course per period
 			Double periods taught in the same room
 			Room constrainted courses accomodated
-		"""
 
+		If `rooms_post_solve` the aggregate version is added instead
+		"""
+		if self.rooms_post_solve:
+			self.add_room_capacity_constraints()
+			return
 
 		# If course taught, gets one room
 		for j in range(len(self.C)):
+			if self.is_second_half(j):
+				continue # same variables as the first half
 			if "Other" not in self.Cd[j] and "Empty" not in self.Cd[j]:
 				for t in self.T:
+					if self.get_double_alias(j, t) is None:
+						continue
 					# m.addConstr(quicksum(Rv[j,s,t] for s in R) == Course[j,t])
 					self.m.addCons(quicksum(self.Rv[j,s,t] for s in self.R) 
 						== self.Course[j,t])
@@ -777,17 +1601,26 @@ class Optimizer():
 		for s in self.R:
 			for t in self.T:
 				# m.addConstr(quicksum(Rv[j,s,t] for j in c_mini) <= 1)
-				#self.m.addCons(quicksum(self.Rv[j,s,t] for j in self.c_mini) <= 1) # <---- this is when there are Other courses included 
-				self.m.addCons(quicksum(self.Rv[j,s,t] for j in self.C) <= 1)
+				#self.m.addCons(quicksum(self.Rv[j,s,t] for j in self.C) <= 1)
+				room_vars = [self.Rv[j,s,t] for j in self.c_mini 
+					if not self.is_constant(self.Rv[j,s,t])]
+				if room_vars == []:
+					continue # special room with none of its courses
+				self.m.addCons(quicksum(room_vars) <= 1)
 				self.num_cons += 1
 		print("\tRooms get at most one course per period")
 
 		# Double periods in the same room
 		for j in self.Cd:
+			if self.alias_doubles:
+				break
 			if self.Db[j] == 1:
 				for t in self.T:
 					if t != 4 and t != 8:
 						for s in self.R:
+							if self.is_constant(self.Rv[j,s,t]) and \
+								self.is_constant(self.Rv[j+1,s,t+1]):
+								continue # both fixed out of this room
 							# m.addConstr(Rv[j,s,t] == Rv[j+1, s, t+1])
 							self.m.addCons(self.Rv[j,s,t] == self.Rv[j+1, s, t+1])
 							self.num_cons += 1
@@ -801,7 +1634,11 @@ class Optimizer():
 			sub_courses = self.constrained_courses[subject] # coruses in this subject
 			sub_rooms = self.constrained_rooms[subject] # appropriate rooms
 			for j in sub_courses:
+				if self.is_second_half(j):
+					continue
 				for t in self.T:
+					if self.get_double_alias(j, t) is None:
+						continue
 					# m.addConstr(quicksum(Rv[j,s,t] for s in sub_rooms) == Course[j,t])
 					self.m.addCons(quicksum(self.Rv[j,s,t] for s in sub_rooms)
 						 == self.Course[j,t])
@@ -809,34 +1646,216 @@ class Optimizer():
 		print("\tCourses with subject specific room needs accomodated")
 
 		# Special rooms don't get other types of courses
+		# (already fixed in the variables if `fix_bounds`)
 		#for subject in ['Art', 'Music', 'Gym']:
 		for subject in ['Art', 'Music', 'Gym', "Resource"]:
+			if self.fix_bounds:
+				break
 			rooms = self.constrained_rooms[subject]
 			sub_courses = set(self.constrained_courses[subject])
-			#non_sub_courses = list(set(self.c_mini) - sub_courses) # set minus
-			non_sub_courses = list(set(self.C) - sub_courses) # set minus <------ when other courses included
+			#non_sub_courses = list(set(self.C) - sub_courses) # set minus
+			non_sub_courses = list(set(self.c_mini) - sub_courses) # set minus
 			# ^^ courses that cannot be in these rooms
 			for j in non_sub_courses:
+				if self.is_second_half(j):
+					continue
 				for t in self.T:
+					if self.get_double_alias(j, t) is None:
+						continue
 					for s in rooms:
 						self.m.addCons(self.Rv[j,s,t] == 0)
 						self.num_cons += 1
 		print("\tReverse subject constrained rooms enforced")
 
+	def get_allowed_rooms(self, course):
+		"""
+		Takes in a course index and returns the list of rooms it can be
+		taught in. Subject constrained courses must be in their subject's
+		rooms, everything else can go anywhere but the Art, Music, Gym,
+		and Resource rooms (mirrors `add_room_constraints`)
+		"""
+		for subject in self.room_constrained_subjects:
+			if course in self.constrained_courses[subject]:
+				return list(self.constrained_rooms[subject])
+
+		special = []
+		for subject in ['Art', 'Music', 'Gym', "Resource"]:
+			special += self.constrained_rooms[subject]
+		return [s for s in self.R if s not in special]
+
+
+	def add_room_capacity_constraints(self):
+		"""
+		Adds the aggregate room constraints used when `rooms_post_solve`:
+		for every set of allowed rooms A (one per room type), the number of
+		courses in a period that can only use rooms in A is at most |A|
+
+		The room type sets are nested or disjoint, so this is exactly the
+		condition for a room matching to exist in each period
+		"""
+		for A, courses in self.get_room_type_sets():
+			for t in self.T:
+				self.m.addCons(quicksum(self.Course[j,t] for j in courses
+					if self.get_double_alias(j, t) is not None) <= len(A))
+				self.num_cons += 1
+		print("\tRoom capacity by type enforced")
+
+	def get_room_type_sets(self):
+		"""
+		Returns a list of (A, courses) for every set of allowed rooms A
+		(one per room type), with the courses that can only use rooms in A
+		"""
+		allowed = {}
+		for j in self.c_mini:
+			allowed[j] = frozenset(self.get_allowed_rooms(j))
+
+		sets = []
+		for A in set(allowed.values()):
+			sets.append((A, [j for j in self.c_mini if allowed[j] <= A]))
+		return sets
+
+
+	def match_rooms(self, CourseV):
+		"""
+		Assigns rooms after the solve (when `rooms_post_solve`), returns
+		RoomV for the course periods in CourseV
+
+		A double period needs one room for both of its periods, so the
+		doubles are placed first, each in a room it can use in both halves
+		(backtracking when a choice leaves one of the two periods without
+		a matching). The remaining courses are then matched to the free
+		rooms one period at a time with augmenting paths. Rooms that fewer
+		room types can use are tried first so general courses stay out of
+		special rooms
+		"""
+		allowed = {}
+		for j in self.c_mini:
+			allowed[j] = self.get_allowed_rooms(j)
+
+		# how many room types can use each room
+		num_types = {}
+		for s in self.R:
+			num_types[s] = len(set(frozenset(allowed[j]) for j in self.c_mini
+				if s in allowed[j]))
+		for j in self.c_mini:
+			allowed[j] = sorted(allowed[j], key=lambda s: num_types[s])
+
+		# (first half, period, second half period) of the doubles, and the
+		# other courses of each period
+		doubles = []
+		singles = {t:[] for t in self.T}
+		second = set()
+		for t in self.T:
+			for j in self.c_mini:
+				if CourseV[j,t] != 1 or (j, t) in second:
+					continue
+				if self.Db[j] == 1 and j+1 in allowed and self.T.index(t) + 1 < len(self.T) \
+						and CourseV[j+1, self.T[self.T.index(t) + 1]] == 1:
+					u = self.T[self.T.index(t) + 1]
+					doubles.append((j, t, u))
+					second.add((j+1, u))
+				else:
+					singles[t].append(j)
+
+		double_rooms = {t:{} for t in self.T} # period --> room --> course
+		matched = {}
+		if not self.place_doubles(doubles, 0, allowed, singles, double_rooms, matched):
+			raise ValueError("Could not find rooms for the courses in periods " +
+				", ".join(str(t) for t in self.T if t not in matched))
+
+		room_of = {} # (course, period) --> room
+		for t in self.T:
+			for s, j in matched[t].items():
+				room_of[j,t] = s
+
+		RoomV = {}
+		for j in self.c_mini:
+			for s in self.R:
+				for t in self.T:
+					RoomV[j,s,t] = int(room_of.get((j,t)) == s)
+		return RoomV
+
+	def place_doubles(self, doubles, k, allowed, singles, double_rooms, matched):
+		"""
+		Helper for `match_rooms`, places doubles[k:] (first half, period,
+		second half period) in rooms free in both of their periods, such
+		that the other courses of those periods can still be matched
+		(backtracking otherwise). Once all are placed, fills in `matched`
+		period --> room --> course and returns True
+		"""
+		if k == len(doubles):
+			for t in self.T:
+				matched[t] = self.match_period(singles[t], allowed, double_rooms[t])
+				if matched[t] is None:
+					del matched[t]
+					return False
+			return True
+
+		j, t, u = doubles[k]
+		for s in allowed[j]:
+			if s not in allowed[j+1] or s in double_rooms[t] or s in double_rooms[u]:
+				continue
+			double_rooms[t][s] = j
+			double_rooms[u][s] = j+1
+			if self.match_period(singles[t], allowed, double_rooms[t]) is not None and \
+					self.match_period(singles[u], allowed, double_rooms[u]) is not None and \
+					self.place_doubles(doubles, k+1, allowed, singles, double_rooms, matched):
+				return True
+			del double_rooms[t][s]
+			del double_rooms[u][s]
+		return False
+
+	def match_period(self, courses, allowed, fixed_rooms):
+		"""
+		Helper for `match_rooms`, matches the courses of a period to the
+		rooms that the doubles (`fixed_rooms`, room --> course) left free,
+		returns room --> course for the whole period or None if there is no
+		matching
+		"""
+		taken = dict(fixed_rooms)
+		fixed = set(fixed_rooms)
+		for j in courses:
+			if not self.augment_room(j, allowed, taken, fixed, set()):
+				return None
+		return taken
+
+
+	def augment_room(self, course, allowed, taken, fixed, seen):
+		"""
+		Helper for `match_rooms`, tries to place `course` in a room
+		moving already placed courses along an augmenting path if needed
+		(`fixed` rooms hold double periods and cannot be moved)
+		"""
+		for s in allowed[course]:
+			if s in seen or s in fixed:
+				continue
+			seen.add(s)
+			if s not in taken or self.augment_room(taken[s], allowed,
+					taken, fixed, seen):
+				taken[s] = course
+				return True
+		return False
+
+
+	@phase
 	def add_rr_constraints(self):
 		"""
 		Adds the resource room requirement
+		(already fixed in the variables if `fix_bounds`)
 		"""
 		for r in ["RR1", "RR2", "RR3"]:
+			if self.fix_bounds:
+				break
 			students = self.RR_student_dict[r]
 			course = self.RR_course_indicies[r]
 			for i in self.S:
 				if i in students:
 					# This student must be in the resource room
-					self.m.addCons(self.X[i,course] == 1)
+					self.m.addCons(self.X[i,course] == self.type_size[i])
 					self.num_cons += 1
-				else:
+				elif (i, course) in self.X:
 					# student not allowed in resource room
+					# (no variable at all if they are not eligible)
 					self.m.addCons(self.X[i,course] == 0)
 					self.num_cons += 1
 
@@ -845,6 +1864,59 @@ class Optimizer():
 
 
 
+	def get_symmetric_sections(self):
+		"""
+		Returns the groups of multi-instance sections that are
+		interchangeable, the sections in a group have the same LP input
+		row (other than the name), teacher, preferences and proximity
+		(sections from the forms usually are not, as only the first
+		section gets the preferences)
+		"""
+		columns = [c for c in self.df.columns if c != "Course Name"]
+
+		groups = []
+		for course_set in self.multi_nested_list:
+			same = {}
+			for j in course_set:
+				key = (tuple(self.df[columns].iloc[j].fillna(-1)),
+					tuple(self.Ta[:,j]), tuple(self.P[:,j]),
+					tuple(self.prox_matrix[:,j]))
+				same[key] = same.get(key, []) + [j]
+			for sections in same.values():
+				if len(sections) > 1:
+					groups.append(sections)
+		return groups
+
+
+	@phase
+	def add_symmetry_constraints(self, order="period"):
+		"""
+		Adds symmetry breaking constraints on interchangeable sections
+		(see `get_symmetric_sections`), for each pair of consecutive sections
+			order="period" - the first is taught in an earlier period
+			order="enrollment" - the first has at least as many students
+		"""
+		if order not in ["period", "enrollment"]:
+			raise ValueError("order must be 'period' or 'enrollment', not " + str(order))
+
+		groups = self.get_symmetric_sections()
+		for sections in groups:
+			for a, b in zip(sections[:-1], sections[1:]):
+				if order == "period":
+					# position of the period in T, strictly earlier if they
+					# share a teacher (they can't be at the same time anyway)
+					gap = 1 if np.sum(self.Ta[:,a]) > 0 else 0
+					self.m.addCons(quicksum(k*self.Course[a,t] for k, t in enumerate(self.T))
+						+ gap <= quicksum(k*self.Course[b,t] for k, t in enumerate(self.T)))
+				else:
+					self.m.addCons(quicksum(self.X[i,a] for i in self.C_S_dict[a])
+						>= quicksum(self.X[i,b] for i in self.C_S_dict[b]))
+				self.num_cons += 1
+		print("\tSymmetry breaking (by " + order + ") for", len(groups),
+			"groups of sections")
+
+
+	@phase
 	def add_period_constraints(self):
 		"""
 		Adds the period constraints
@@ -852,18 +1924,19 @@ class Optimizer():
 		"""
 		# Force "Other" courses in specific periods
 		for i in range(len(self.T)):
+			if self.fix_bounds:
+				# as a bound instead of a row
+				self.m.chgVarLb(self.Course[self.other_indicies[i], self.T[i]], 1)
+				continue
 			# m.addConstr(Course[other_indicies[i], T[i]] == 1)
 			self.m.addCons(self.Course[self.other_indicies[i], self.T[i]] == 1)
 			self.num_cons += 1
 		print("\t`Other` courses in each period")
 
 
-	def set_objective(self):
+	def set_gap(self):
 		"""
-		Sets the objective
-			Minimizes the number of others, while
-			maximizing the preference score
-		also sets the GAP
+		Sets the GAP (.33 if None)
 		"""
 		if self.GAP is not None:
 			self.m.setRealParam('limits/gap', self.GAP)
@@ -871,30 +1944,25 @@ class Optimizer():
 			self.m.setRealParam('limits/gap', .33)
 		print("GAP set at", self.GAP)
 
+	@phase
+	def set_objective(self):
+		"""
+		Sets the objective
+			Minimizes the number of others, while
+			maximizing the preference score
+		also sets the GAP
+		"""
+		self.set_gap()
+
 		# Set up senority multiplier
 		s = {}
 		for i in self.S:
-			g = self.student_dict[i].grade
-			# print("In grade:", g)
-			if g in [7,11]:
-				s[i] = 2
-				#print("\t2")
-			elif g in [8,12]:
-				s[i] = 4
-				#print("\t4")
-			elif g in [6]:
-				s[i] = 1000
-			else:
-				s[i] = 1
-				#print("\t1")
+			s[i] = self.get_seniority(i)
 		#print(s)
 
 		# Make a copy of the preference matrix that puts all the zeros 
 		# with -10's
-		P2 = self.P.copy()
-		P2[P2==1] = 3
-		P2[P2==2] = 4
-		P2[P2==3] = 5
+		P2 = self.get_preference_scores()
 		self.Ptest = P2
 		print(P2)
 
@@ -909,7 +1977,7 @@ class Optimizer():
 		self.m.setObjective(-1*quicksum(self.X[i,j] for i in self.S 
 			for j in self.other_indicies) + 
 			quicksum(s[i]*self.X[i,j]*P2[i][j] for i in self.S 
-			for j in mini), "maximize")
+			for j in self.S_C_dict[i] if j in mini), "maximize")
 
 
 		# Quick test with just 6th graders without senority
@@ -919,6 +1987,319 @@ class Optimizer():
 		# 	for j in O.C), "maximize")
 		# print("Objective Set")
 
+	def get_preference_scores(self):
+		"""
+		Returns the preference matrix with the scores the objective uses
+		for each rank (1, 2, 3 --> 3, 4, 5)
+		"""
+		P2 = self.P.copy()
+		P2[P2==1] = 3
+		P2[P2==2] = 4
+		P2[P2==3] = 5
+		return P2
+
+	def get_seniority(self, i):
+		"""
+		Returns the senority multiplier of student i in the objective
+		(by grade, `seniority` overrides the defaults)
+		"""
+		g = self.student_dict[i].grade
+		if self.seniority is not None and g in self.seniority:
+			return self.seniority[g]
+		# print("In grade:", g)
+		if g in [7,11]:
+			return 2
+		elif g in [8,12]:
+			return 4
+		elif g in [6]:
+			return 1000
+		return 1
+
+	def get_type_of(self):
+		"""
+		Returns a dictionary student --> first student of their type
+		(themselves unless `student_types`)
+		"""
+		type_of = {}
+		for k in self.type_members:
+			for i in self.type_members[k]:
+				type_of[i] = k
+		return type_of
+
+	def warm_start(self, solution):
+		"""
+		Takes in a previous Solution (or the path to its solution.pkl) and
+		gives it to SCIP as a partial starting solution. It is matched onto
+		this model by course name and student id, so the data can have
+		changed a bit since (see `map_solution` for what is kept). SCIP
+		completes the rest (new courses and students, rooms) at the start
+		of the solve
+		Call it after the constraints are added, before `optimize`
+		"""
+		if isinstance(solution, str):
+			solution = open_sol(solution)
+		periods, rooms, courses = self.map_solution(solution)
+
+		# (variable, value) entries of the partial solution, SCIP skips
+		# a partial solution that leaves too much unknown, so the 0's are
+		# set too wherever they are known
+		values = []
+		for j in periods:
+			for t in self.T:
+				values.append((self.Course[j,t], int(periods[j] == t)))
+		for j in rooms:
+			for s in self.R:
+				for t in self.T:
+					values.append((self.Rv[j,s,t], int(rooms[j] == s and periods[j] == t)))
+
+		# (counts for student types, so all of a type must be matched with
+		# a full schedule, a single student also gets their 1's otherwise)
+		type_of = self.get_type_of()
+		X = {}
+		for i in courses:
+			for j in courses[i]:
+				X[type_of[i],j] = X.get((type_of[i],j), 0) + 1
+		for k in self.S:
+			full = all(len(courses.get(i, [])) == len(self.T)
+				for i in self.type_members[k])
+			if not full and self.type_size[k] > 1:
+				continue
+			for j in self.S_C_dict[k]:
+				if not full and (k,j) not in X:
+					continue
+				values.append((self.X[k,j], X.get((k,j), 0)))
+				for t in self.T:
+					if full or periods[j] == t:
+						values.append((self.U[k,j,t], X.get((k,j), 0)*int(periods.get(j) == t)))
+
+		sol = self.m.createPartialSol()
+		for var, value in values:
+			if not self.is_constant(var):
+				self.m.setSolVal(sol, var, value)
+		self.m.addSol(sol)
+
+		print("\tWarm start with", len(periods), "of", len(self.C), "courses placed,",
+			len(rooms), "with rooms, and", sum(len(courses[i]) for i in courses),
+			"student/course assignments")
+
+	def repair(self, solution, changed, neighborhood=5):
+		"""
+		Sets up a re-solve of a few students on a published schedule, takes
+		in the previous Solution (or the path to its solution.pkl) and the
+		(current) indicies of the students that changed. The master schedule
+		(periods and rooms of the courses that are still there, see
+		`map_solution`) and everyone else's schedule are fixed, only these
+		are left free:
+			the changed students, and students not in the old solution
+			students whose old schedule does not fit any more
+			up to `neighborhood` students for each changed student, the
+			ones sharing the most courses with them (so there is room to
+			move within MAX)
+		The old solution is also given as a warm start (see `warm_start`)
+		Call it after the constraints are added, then `optimize` as usual
+		"""
+		if isinstance(solution, str):
+			solution = open_sol(solution)
+		periods, rooms, courses = self.map_solution(solution)
+
+		def fits(var, value):
+			# can't fix against a bound (e.g. fixings, `Other` locks)
+			return self.is_constant(var) or (var.getLbOriginal() <= value
+				and value <= var.getUbOriginal())
+
+		# master schedule
+		fixed = []
+		for j in list(periods.keys()):
+			course_fix = [(self.Course[j,t], int(periods[j] == t)) for t in self.T]
+			if not all(fits(var, value) for var, value in course_fix):
+				periods.pop(j)
+				continue
+			fixed += course_fix
+		for j in rooms:
+			if j not in periods:
+				continue
+			for s in self.R:
+				for t in self.T:
+					fixed.append((self.Rv[j,s,t], int(rooms[j] == s and periods[j] == t)))
+
+		# students left free
+		free = set(changed)
+		for i in self.all_S:
+			kept = courses.get(i, [])
+			if len(kept) != len(self.T) or any(j not in periods for j in kept):
+				free.add(i)
+		for i in changed:
+			mine = set(courses.get(i, []))
+			shared = []
+			for other in courses:
+				n = len(mine.intersection(courses[other]))
+				if other not in free and n > 0:
+					shared.append((n, other))
+			shared.sort(reverse=True)
+			free.update(other for n, other in shared[:neighborhood])
+
+		# everyone else is fixed (a whole type, for student types)
+		n_fixed = 0
+		for k in self.S:
+			if any(i in free for i in self.type_members[k]):
+				continue
+			X = {}
+			for i in self.type_members[k]:
+				for j in courses[i]:
+					X[j] = X.get(j, 0) + 1
+			student_fix = []
+			for j in self.S_C_dict[k]:
+				student_fix.append((self.X[k,j], X.get(j, 0)))
+				for t in self.T:
+					student_fix.append((self.U[k,j,t], X.get(j, 0)*int(periods.get(j) == t)))
+			if not all(fits(var, value) for var, value in student_fix):
+				free.update(self.type_members[k])
+				continue
+			fixed += student_fix
+			n_fixed += self.type_size[k]
+
+		for var, value in fixed:
+			if not self.is_constant(var):
+				self.m.chgVarLb(var, value)
+				self.m.chgVarUb(var, value)
+		print("\tRepair with", len(periods), "courses and", n_fixed, "of",
+			len(self.all_S), "students fixed")
+
+		self.warm_start(solution)
+
+	def map_solution(self, solution):
+		"""
+		Maps a previous Solution onto this model, returns
+			periods - course --> period, for the courses (by name) that
+					  are still there, a double's second half right after its
+					  first, and a teacher's courses in different periods
+			rooms - course --> room, for the courses in `periods` whose
+					  room is still allowed and free (none if rooms are
+					  assigned after the solve)
+			courses - student --> courses they keep, matched by student id
+					  (or name if there is no id), only eligible courses with
+					  a period, at most one a period, both halves of a double,
+					  one section of a multi-instance course, and up to MAX
+		Anything dropped is left for SCIP to fill in
+		"""
+		old_index = {}
+		for j in solution.Cd:
+			old_index[solution.Cd[j]] = j
+
+		# Course periods
+		periods = {}
+		for j in self.C:
+			if self.Cd[j] not in old_index or self.is_second_half(j):
+				continue
+			if j > 0 and self.Db[j-1] == 1:
+				continue # second halves follow their first half below
+			old = old_index[self.Cd[j]]
+			taught = [t for t in self.T if solution.CourseV.get((old, t), 0) == 1]
+			if len(taught) != 1:
+				continue
+			t = taught[0]
+			if self.Db[j] == 1:
+				if t == 4 or t == 8:
+					continue
+				periods[j+1] = self.T[self.T.index(t) + 1]
+			periods[j] = t
+
+		# a teacher's courses can't be in the same period
+		for k in self.I_course_index:
+			used = {}
+			for j in self.I_course_index[k]:
+				if j not in periods:
+					continue
+				if periods[j] in used and used[periods[j]] != j:
+					periods.pop(j)
+					if self.Db[j] == 1:
+						periods.pop(j+1, None)
+					continue
+				used[periods[j]] = j
+		for j in list(periods.keys()):
+			if self.Db[j] == 1 and j+1 not in periods:
+				periods.pop(j, None)
+			if j > 0 and self.Db[j-1] == 1 and j-1 not in periods:
+				periods.pop(j, None)
+
+		# Rooms
+		rooms = {}
+		used = set()
+		for j in periods:
+			if self.rooms_post_solve:
+				break
+			if j not in self.c_mini or (j > 0 and self.Db[j-1] == 1):
+				continue # with its first half
+			old = old_index[self.Cd[j]]
+			room = [s for s in self.R
+				if solution.RoomV.get((old, s, periods[j]), 0) == 1]
+			if len(room) != 1 or room[0] not in self.get_allowed_rooms(j):
+				continue
+			group = [j, j+1] if self.Db[j] == 1 else [j]
+			if any((room[0], periods[g]) in used for g in group):
+				continue
+			for g in group:
+				rooms[g] = room[0]
+				used.add((room[0], periods[g]))
+
+		# Students
+		def student_key(student):
+			if not np.isnan(student.s_id):
+				return int(student.s_id)
+			return (student.first_name, student.last_name)
+
+		old_students = {}
+		for i in solution.student_dict:
+			old_students[student_key(solution.student_dict[i])] = i
+
+		new_index = {}
+		for j in self.C:
+			new_index[self.Cd[j]] = j
+		multi_of = {}
+		for course_set in self.multi_nested_list:
+			for j in course_set:
+				multi_of[j] = tuple(course_set)
+
+		type_of = self.get_type_of() # (for eligibility)
+
+		enrollment = {}
+		courses = {}
+		for i in self.all_S:
+			key = student_key(self.student_dict[i])
+			if key not in old_students:
+				continue
+			old = old_students[key]
+			taken_periods = set()
+			taken_multi = set()
+			kept = []
+			for old_j in solution.Cd:
+				if solution.XV.get((old, old_j), 0) != 1:
+					continue
+				j = new_index.get(solution.Cd[old_j])
+				if j is None or j not in periods or self.is_second_half(j):
+					continue
+				if j > 0 and self.Db[j-1] == 1:
+					continue # added with its first half
+				group = [j, j+1] if self.Db[j] == 1 else [j]
+				if any((type_of[i], g) not in self.X for g in group):
+					continue # not eligible any more
+				if any(periods[g] in taken_periods for g in group):
+					continue
+				if multi_of.get(j) in taken_multi:
+					continue
+				if any(enrollment.get(g, 0) >= self.MAX[g] for g in group):
+					continue # (False for NaN MAX)
+				for g in group:
+					kept.append(g)
+					taken_periods.add(periods[g])
+					enrollment[g] = enrollment.get(g, 0) + 1
+				if j in multi_of:
+					taken_multi.add(multi_of[j])
+			courses[i] = kept
+
+		return periods, rooms, courses
+
+	@phase
 	def optimize(self):
 		"""
 		Runs the optimization sequence
@@ -928,10 +2309,1181 @@ class Optimizer():
 		print("-"*30 + " Optimization Starting " + "-"*30)
 		print("Number of variables:", self.num_vars)
 		print("Number of constraints:", self.num_cons)
+		if self.from_cache:
+			self.check_model_calls()
+		if self.progress_handler is None and (self.progress is not None or
+				self.checkpoint_interval is not None):
+			self.progress_handler = Progress(self)
+			self.m.includeEventhdlr(self.progress_handler, "progress",
+				"reports and saves new best solutions")
 		start_time = datetime.datetime.now()
 		print("Optimization start time:", start_time)
 		self.m.optimize()
+		print("Optimization time:", datetime.datetime.now() - start_time)
+		for family, (added, rows) in self.get_lazy_report().items():
+			print("\tLazy", family, "rows added:", added, "of", rows)
+
+	def get_objective_tiers(self, ratio=10):
+		"""
+		Splits the students into the tiers of `optimize_tiered` by senority
+		(see `get_seniority`), a new tier starts wherever a multiplier is at
+		least `ratio` times the next smaller one (so the 6th graders are a
+		tier of their own). Returns a list of (students, scale) from the top
+		tier down, scale is the smallest multiplier in the tier
+		"""
+		multipliers = sorted(set(self.get_seniority(i) for i in self.S), reverse=True)
+		tiers = []
+		current = []
+		for n, value in enumerate(multipliers):
+			current.append(value)
+			if n == len(multipliers) - 1 or value >= ratio*multipliers[n+1]:
+				tiers.append(([i for i in self.S if self.get_seniority(i) in current],
+					min(current)))
+				current = []
+		return tiers
+
+	@phase
+	def optimize_tiered(self, tolerance=0, time_limit=None):
+		"""
+		Lexicographic version of `optimize`, instead of the huge senority
+		multipliers of `set_objective` each tier of students (see
+		`get_objective_tiers`) is optimized on its own, from the top one
+		down, with their multipliers divided by the tier's scale. After each
+		tier its score is kept as a constraint (down to `tolerance` times
+		it, e.g. .01 gives up to 1% of it) and the same model is solved for
+		the next tier, starting from the last schedule. The `Other` courses
+		count in the last tier (divided by its scale as well). Each tier
+		uses the GAP and `time_limit`. Returns the objective of
+		`set_objective` of the final schedule (the tier scores times their
+		scale, less the `Other` courses), or None if a tier found no schedule
+		"""
+		P2 = self.get_preference_scores()
+		mini = range(len(self.C) - 3)
+		if time_limit is not None:
+			self.m.setRealParam('limits/time', time_limit)
+		self.set_gap()
+
+		tiers = self.get_objective_tiers()
+		scores = [] # (score expression, its scale)
+		values = []
+		others = quicksum(self.X[i,j] for i in self.S for j in self.other_indicies)
+		for n, (students, scale) in enumerate(tiers):
+			expr = quicksum(self.get_seniority(i)/scale*P2[i][j]*self.X[i,j]
+				for i in students for j in self.S_C_dict[i] if j in mini)
+			objective = expr
+			if n == len(tiers) - 1:
+				objective = expr - 1/scale*others
+
+			if n > 0:
+				# keep the last tier's score, and start from its schedule
+				self.m.freeTransform()
+				last, _ = scores[-1]
+				self.m.addCons(last >= value - tolerance*abs(value))
+				self.num_cons += 1
+			self.m.setObjective(objective, "maximize")
+			if values != []:
+				sol = self.m.createSol()
+				for var, x in values:
+					self.m.setSolVal(sol, var, x)
+				self.m.addSol(sol)
+			scores.append((expr, scale))
+
+			print("Tier", n + 1, "of", len(tiers), "with", len(students), "students")
+			start_time = datetime.datetime.now()
+			self.m.optimize()
+			print("\tTier time:", datetime.datetime.now() - start_time)
+			if self.m.getNSols() == 0:
+				print("\tNo schedule found for the tier")
+				return None
+			value = self.m.getObjVal()
+			print("\tTier score:", value)
+			values = [(var, self.m.getVal(var)) for var in self.m.getVars()]
+
+		return sum(scale*self.m.getVal(expr) for expr, scale in scores) - \
+			self.m.getVal(others)
+
+	def save_checkpoint(self):
+		"""
+		Saves the best solution so far to `save_location` in the middle of
+		the solve, the value dictionaries as `save_dicts` does and the
+		Solution as solution.pkl (to give `warm_start` after a crash).
+		Each file is written aside and then moved in place, so a crash
+		while saving leaves the previous checkpoint
+		"""
+		XV, CourseV, RoomV, UV = self.get_value_dicts()
+		solution = Solution(Cd=self.Cd, C=self.C, XV=XV, CourseV=CourseV,
+			RoomV=RoomV, student_dict=self.student_dict, I_C_dict=self.I_C_dict,
+			Ta=self.Ta, R=self.R, m=None,
+			save_loc=self.save_location + "/solution.pkl")
+
+		at = self.save_location
+		for name, values in [("xv", XV), ("coursev", CourseV), ("roomv", RoomV),
+				("uv", UV), ("solution", solution)]:
+			f = at + "/" + name + ".pkl"
+			pickle.dump(values, open(f + ".tmp", 'wb'), pickle.HIGHEST_PROTOCOL)
+			os.replace(f + ".tmp", f)
+		print("\tCheckpoint saved to", at)
+
+	@phase
+	def decompose(self, iterations=3, time_limit=None):
+		"""
+		Solves the model in two stages instead of all at once (use it in
+		place of `optimize` and `assign_value_dicts`):
+			1. the timetable is chosen from the aggregate demand alone
+			   (see `schedule_courses`)
+			2. the built model is solved with the Course variables fixed to
+			   that timetable, which leaves placing the students (and rooms)
+			   with all of their constraints (MAX, requirements, RR, ...)
+		This is repeated `iterations` times, each time the pairs of courses
+		that kept students out of a course they wanted are weighted up by
+		the preference that was lost, and the timetables already tried are
+		cut off. The best result is left in XV, CourseV, RoomV and UV (and
+		the Course variables are freed again afterwards)
+		`time_limit` applies to each stage on its own (None for no limit)
+		"""
+		print("Decomposing with", len(self.S), "students")
+		if self.from_cache:
+			self.check_model_calls()
+
+		# the Course variables (once each) and their bounds
+		bounds = {}
+		for j in self.C:
+			for t in self.T:
+				if self.get_double_alias(j, t) != (j, t) or \
+					self.is_constant(self.Course[j,t]):
+					continue
+				var = self.Course[j,t]
+				bounds[j,t] = (var.getLbOriginal(), var.getUbOriginal())
+
+		if time_limit is not None:
+			self.m.setRealParam('limits/time', time_limit)
+
+		representatives = self.S
+		extra = {} # feedback (course, course) --> weight
+		tried = []
+		best = None
+		for n in range(iterations):
+			# Stage one
+			weights = self.get_conflict_weights(extra)
+			periods = self.schedule_courses(weights, tried, time_limit)
+			if periods is None:
+				print("\tNo timetables left to try")
+				break
+			tried.append(periods)
+			if any(int(periods[j] == t) < bounds[j,t][0] or
+					int(periods[j] == t) > bounds[j,t][1] for j, t in bounds):
+				print("\tTimetable", n+1, "goes against a fixed course, skipped")
+				continue
+
+			# Stage two
+			self.m.freeTransform()
+			for (j, t) in bounds:
+				var = self.Course[j,t]
+				value = int(periods[j] == t)
+				self.m.chgVarLb(var, 0)
+				self.m.chgVarUb(var, 1)
+				self.m.chgVarLb(var, value)
+				self.m.chgVarUb(var, value)
+			self.S = representatives
+			start_time = datetime.datetime.now()
+			self.m.optimize()
+			print("\tTimetable", n+1, "solved in", datetime.datetime.now() - start_time,
+				"(" + self.m.getStatus() + ")")
+			if self.m.getNSols() == 0:
+				continue
+			objective = self.m.getObjVal()
+			self.assign_value_dicts()
+			print("\tTimetable", n+1, "objective", objective)
+			if best is None or objective > best[0]:
+				best = (objective, self.XV, self.CourseV, self.RoomV, self.UV)
+
+			# Feedback, the course taken in the way of each wanted course
+			taken = {} # (student, period) --> course
+			for i in self.S:
+				for j in self.C:
+					for t in self.T:
+						if self.UV[i,j,t] == 1:
+							taken[i,t] = j
+			for i in self.S:
+				for course_set in self.get_wanted_groups(i):
+					if any(self.XV[i,j] == 1 for j in course_set):
+						continue
+					lost = max(self.P[i][j] for j in course_set)/len(course_set)
+					for j in course_set:
+						occupied = [periods[j]]
+						if self.Db[j] == 1:
+							occupied.append(periods[j] + 1)
+						for t in occupied:
+							k = taken.get((i,t))
+							if k is None or k == j:
+								continue
+							pair = (min(j,k), max(j,k))
+							extra[pair] = extra.get(pair, 0) + lost
+
+		# the model is left as it was built
+		self.m.freeTransform()
+		for (j, t), (lb, ub) in bounds.items():
+			self.m.chgVarLb(self.Course[j,t], lb)
+			self.m.chgVarUb(self.Course[j,t], ub)
+
+		if best is None:
+			raise ValueError("No timetable could be completed with students")
+		objective, self.XV, self.CourseV, self.RoomV, self.UV = best
+		print("\tBest objective", objective)
+
+	@phase
+	def lns(self, time_budget, sub_time=30, num_courses=3, seed=0):
+		"""
+		Large neighborhood search from the current solution (call it after
+		`optimize` and `assign_value_dicts`, or `decompose`). Until
+		`time_budget` seconds are used up it frees one neighborhood at a
+		time (see `get_neighborhood`), fixes everything else to the
+		incumbent, and re-solves that for up to `sub_time` seconds from
+		the incumbent, keeping it if it is better
+		Each round is logged in `lns_log`, returns the best as a Solution
+		"""
+		if self.XV == {}:
+			raise ValueError("LNS needs a solution to start from, call " +
+				"optimize and assign_value_dicts (or decompose) first")
+		rng = np.random.RandomState(seed)
+		incumbent = self.get_model_values()
+		bounds = [(var, var.getLbOriginal(), var.getUbOriginal())
+			for var in self.m.getVars()]
+
+		def fix(keys):
+			# only the keys that are given are fixed
+			self.m.freeTransform()
+			for var, lb, ub in bounds:
+				self.m.chgVarUb(var, ub)
+				self.m.chgVarLb(var, lb)
+			for key in keys:
+				var, value = incumbent[key]
+				self.m.chgVarLb(var, value)
+				self.m.chgVarUb(var, value)
+			sol = self.m.createSol()
+			for var, value in incumbent.values():
+				self.m.setSolVal(sol, var, value)
+			self.m.addSol(sol)
+
+		best = sum(var.getObj()*value for var, value in incumbent.values())
+		print("LNS from objective", best)
+		# the GAP is for the whole model, each neighborhood is solved out
+		self.m.setRealParam('limits/gap', 0)
+		self.lns_log = []
+		start = timeit.default_timer()
+		while timeit.default_timer() - start < time_budget:
+			name, students, courses, periods = self.get_neighborhood(rng, num_courses)
+			free = []
+			for key in incumbent:
+				if key[0] in ["X", "U"] and (key[1] in students or key[2] in courses):
+					free.append(key)
+				elif key[0] in ["Course", "Rv"] and key[1] in courses and \
+					key[-1] in periods:
+					free.append(key)
+			fix(set(incumbent.keys()) - set(free))
+
+			left = time_budget - (timeit.default_timer() - start)
+			self.m.setRealParam('limits/time', max(1, min(sub_time, left)))
+			self.m.optimize()
+
+			improved = False
+			if self.m.getNSols() > 0:
+				objective = self.m.getObjVal()
+				if objective > best + 1e-6:
+					improved = True
+					best = objective
+					for key in free:
+						var, value = incumbent[key]
+						incumbent[key] = (var, int(round(self.m.getVal(var))))
+			record = {"seconds":timeit.default_timer() - start,
+				"neighborhood":name, "free variables":len(free),
+				"objective":best, "improved":improved}
+			self.lns_log.append(record)
+			print("\tLNS %.1f s:" % record["seconds"], name, "(" + str(len(free)),
+				"free), objective", best, "(improved)" if improved else "")
+
+		self.assign_fixed(incumbent.values())
+		return self.get_solution()
+
+	def assign_fixed(self, values):
+		"""
+		Takes in (variable, value) pairs for every variable of the model and
+		fills in the value dictionaries from them (as `assign_value_dicts`),
+		by solving the model once with all of them fixed (it is left that way)
+		"""
+		self.m.freeTransform()
+		for var, value in values:
+			self.m.chgVarLb(var, 0)
+			self.m.chgVarUb(var, value)
+			self.m.chgVarLb(var, value)
+		self.set_gap()
+		self.m.optimize()
+		self.S = sorted(self.type_members.keys())
+		self.assign_value_dicts()
+
+	@phase
+	def portfolio(self, workers=4, time_limit=None, settings=None, variants=[]):
+		"""
+		Solves the model with `workers` SCIP processes at once, each with
+		its own settings, `Portfolio.PORTFOLIO` by default (a list of
+		dictionaries with "seed", "emphasis" ("feasibility"/"optimality")
+		and "symmetry", taken in turn). The model is written to a file that
+		the workers read, every new best solution is passed on to the other
+		workers (by variable name, through files in a temporary directory),
+		and it stops as soon as one of them gets to the GAP, or all of them
+		are done (`time_limit` is for each). A worker that fails is reported
+		and the others go on
+
+		`variants` are other built Optimizers of the same instance with the
+		same variables but other constraints (e.g. `linking`), the workers
+		take turns between this model and those
+
+		The value dictionaries are filled in from the best solution (see
+		`assign_fixed`), which is also returned as a Solution
+		"""
+		if self.lazy or any(other.lazy for other in variants):
+			raise ValueError("The workers read the model from a file, which " +
+				"has no lazy rows (build it with lazy=False)")
+		if settings is None:
+			settings = PORTFOLIO
+		check_settings(settings)
+		names = set(var.name for var in self.m.getVars())
+		for other in variants:
+			if set(var.name for var in other.m.getVars()) != names:
+				raise ValueError("The variants need the same variables as the model")
+		if self.from_cache:
+			self.check_model_calls()
+		gap = self.GAP if self.GAP is not None else .33
+		maximize = self.m.getObjectiveSense() == "maximize"
+
+		directory = tempfile.mkdtemp()
+		files = []
+		for n, O in enumerate([self] + list(variants)):
+			files.append(os.path.join(directory, "model" + str(n) + ".cip"))
+			O.m.writeProblem(files[-1])
+
+		print("Portfolio of", workers, "workers with", len(self.S), "students")
+		start_time = datetime.datetime.now()
+		# (spawned, the workers must not share SCIP with this process)
+		context = multiprocessing.get_context("spawn")
+		outbox = context.Queue()
+		processes = []
+		for w in range(workers):
+			processes.append(context.Process(target=solve_worker, args=(w,
+				files[w % len(files)], settings[w % len(settings)], gap,
+				time_limit, directory, outbox)))
+			processes[w].start()
+
+		done = set()
+		while len(done) < workers:
+			# a worker that was already gone before the wait has its report
+			# in the queue by then, unless it died without one
+			gone = [w for w in range(workers) if w not in done and
+				processes[w].exitcode is not None]
+			try:
+				w, status, objective, bound = outbox.get(timeout=1)
+			except queue.Empty:
+				if gone == []:
+					continue
+				w, status, objective, bound = gone[0], "died (exit code " + \
+					str(processes[gone[0]].exitcode) + ")", None, None
+			if w in done:
+				continue
+			done.add(w)
+			print("\tWorker", w, "done (" + status + ") at",
+				datetime.datetime.now() - start_time, "objective", objective,
+				"bound", bound)
+			if status in ["optimal", "gaplimit"]:
+				break
+		for process in processes:
+			process.terminate()
+			process.join()
+
+		best = None
+		for objective, values in read_solutions(directory):
+			if best is None or (objective > best[0] if maximize else objective < best[0]):
+				best = (objective, values)
+		shutil.rmtree(directory)
+		print("Portfolio time:", datetime.datetime.now() - start_time)
+
+		if best is None:
+			raise ValueError("None of the workers found a schedule")
+		variables = {var.name:var for var in self.m.getVars()}
+		self.assign_fixed((variables[name], value) for name, value in best[1].items())
+		return self.get_solution()
+
+	def get_neighborhood(self, rng, num_courses=3):
+		"""
+		Picks a random neighborhood for `lns`, one of
+			grade - the students of one grade
+			periods - the courses taught in a pair of periods, which can
+					  swap between the two, with their students
+			department - the courses of one subject in `prox_dict`, with
+						 their students
+			courses - `num_courses` courses, with their students
+		Returns (name, free students, free courses, periods the free
+		courses can be taught in), the students being the first of each
+		type (see `set_student_types`). Every student's place in the free
+		courses is free as well, for periods that is all that is free
+		"""
+		type_of = self.get_type_of()
+		kind = rng.choice(["grade", "periods", "department", "courses"])
+		courses = set()
+		periods = list(self.T)
+		if kind == "grade":
+			grades = sorted(set(self.student_dict[i].grade for i in self.all_S
+				if not pd.isnull(self.student_dict[i].grade)))
+			grade = grades[rng.randint(len(grades))]
+			students = set(type_of[i] for i in self.all_S
+				if self.student_dict[i].grade == grade)
+			return "grade " + str(grade), students, courses, periods
+
+		if kind == "periods":
+			periods = sorted(int(t) for t in rng.choice(self.T, 2, replace=False))
+			name = "periods " + str(periods[0]) + " and " + str(periods[1])
+			for j in self.C:
+				occupied = [t for t in self.T if self.CourseV[j,t] == 1]
+				if j > 0 and self.Db[j-1] == 1:
+					continue # with the first half
+				if self.Db[j] == 1:
+					occupied += [t+1 for t in occupied]
+				if occupied != [] and all(t in periods for t in occupied):
+					courses.add(j)
+			self.add_double_halves(courses)
+			return name, set(), courses, periods
+		elif kind == "department":
+			subject = rng.choice(sorted(self.prox_dict.keys()))
+			flags = self.get_proximity_coefficients(subject)
+			courses = set(j for j in self.c_mini if flags[j] == 1)
+			name = "department " + str(subject)
+		else:
+			chosen = rng.choice(self.c_mini, num_courses, replace=False)
+			courses = set(int(j) for j in chosen)
+			name = "courses " + ", ".join(self.Cd[j] for j in sorted(courses))
+		self.add_double_halves(courses)
+
+		students = set(type_of[i] for i in self.all_S for j in courses
+			if self.XV[i,j] == 1)
+		return name, students, courses, periods
+
+	def get_model_values(self):
+		"""
+		Returns the value dictionaries (XV, CourseV, RoomV, UV) as a
+		dictionary (kind, key...) --> (model variable, value), once for each
+		variable (counts for student types)
+		"""
+		values = {}
+		for j in self.C:
+			for t in self.T:
+				if self.get_double_alias(j, t) != (j, t):
+					continue
+				if not self.is_constant(self.Course[j,t]):
+					values["Course",j,t] = (self.Course[j,t], self.CourseV[j,t])
+				for s in self.R:
+					if (j, s, t) in self.Rv and not self.is_constant(self.Rv[j,s,t]):
+						values["Rv",j,s,t] = (self.Rv[j,s,t], self.RoomV[j,s,t])
+
+		for k in self.type_members:
+			for j in self.S_C_dict[k]:
+				if self.is_second_half(j):
+					continue
+				n = sum(self.XV[i,j] for i in self.type_members[k])
+				if not self.is_constant(self.X[k,j]):
+					values["X",k,j] = (self.X[k,j], n)
+				for t in self.T:
+					if self.get_double_alias(j, t) != (j, t) or \
+						self.is_constant(self.U[k,j,t]):
+						continue
+					n = sum(self.UV[i,j,t] for i in self.type_members[k])
+					values["U",k,j,t] = (self.U[k,j,t], n)
+		return values
+
+	def get_solution(self, save_loc=None):
+		"""
+		Returns the current solution (value dictionaries) as a Solution,
+		to be saved at `save_loc` (solution.pkl in `save_location` if None)
+		"""
+		if save_loc is None and self.save_location is not None:
+			save_loc = self.save_location + "/solution.pkl"
+		return Solution(Cd=self.Cd, C=self.C, XV=self.XV, CourseV=self.CourseV,
+			RoomV=self.RoomV, student_dict=self.student_dict,
+			I_C_dict=self.I_C_dict, Ta=self.Ta, R=self.R, m=self.m,
+			save_loc=save_loc)
+
+	def get_wanted_groups(self, i):
+		"""
+		Returns the courses student i wants (positive preference) as a list
+		of groups, the sections of a multi-instance course together and any
+		other course on its own
+		"""
+		groups = []
+		seen = set()
+		for course_set in self.multi_nested_list:
+			if any(self.P[i][j] > 0 for j in course_set):
+				groups.append(list(course_set))
+			seen.update(course_set)
+		for j in self.c_mini:
+			if j not in seen and self.P[i][j] > 0:
+				groups.append([j])
+		return groups
+
+	def get_conflict_weights(self, extra={}):
+		"""
+		Returns a dictionary (course, course) --> weight (smaller index
+		first) of the students that want both, the aggregate demand that
+		`schedule_courses` works from. Each student adds the smaller of the
+		two preferences (times the size of their type), a multi-instance
+		course counts for each of its sections (split evenly between them),
+		a double period for both halves, and a resource room as a 3 for its
+		students. Sections of one course and the halves of a double don't
+		conflict. `extra` is added on top
+		"""
+		group_of = {}
+		for course_set in self.multi_nested_list:
+			for j in course_set:
+				group_of[j] = course_set
+
+		weights = dict(extra)
+		for i in self.S:
+			wanted = {}
+			for course_set in self.get_wanted_groups(i):
+				pref = max(self.P[i][j] for j in course_set)/len(course_set)
+				for j in course_set:
+					wanted[j] = pref
+					if self.Db[j] == 1:
+						wanted[j+1] = pref
+			for r in ["RR1", "RR2", "RR3"]:
+				if i in self.RR_student_dict[r]:
+					wanted[self.RR_course_indicies[r]] = 3
+
+			courses = sorted(wanted.keys())
+			for a, j in enumerate(courses):
+				for k in courses[a+1:]:
+					if k in group_of.get(j, []) or (self.Db[j] == 1 and k == j+1):
+						continue
+					w = self.type_size[i]*min(wanted[j], wanted[k])
+					weights[j,k] = weights.get((j,k), 0) + w
+		return weights
+
+	def schedule_courses(self, weights, tried=[], time_limit=None, stall_nodes=500):
+		"""
+		Stage one of `decompose`, chooses the timetable with a small ILP
+		over the course periods only (the same timetable constraints as the
+		full model):
+			every course taught once
+			double periods consecutive, not starting in 4th or 8th
+			teachers teach at most one course per period
+			`Other` courses in their period
+			room capacity by type (as `add_room_capacity_constraints`)
+		minimizing the weight (see `get_conflict_weights`) of the pairs of
+		courses taught at the same time. The timetables in `tried` are cut
+		off (and the search stops after `stall_nodes` nodes without a better
+		one). Returns a dictionary course --> period, or None if there is
+		no timetable left
+		"""
+		m = Model()
+		m.hideOutput()
+		if time_limit is not None:
+			m.setRealParam('limits/time', time_limit)
+		# the clash bound from the LP is weak, so stop once the timetable
+		# stops improving rather than trying to prove it
+		m.setLongintParam('limits/stallnodes', stall_nodes)
+
+		Course = {}
+		for j in self.C:
+			for t in self.T:
+				Course[j,t] = m.addVar(vtype="B", name="Course " + str(j) +
+					" in period " + str(t))
+
+		for j in self.C:
+			m.addCons(quicksum(Course[j,t] for t in self.T) == 1)
+			if self.Db[j] == 1:
+				for t in self.T:
+					if t == 4 or t == 8:
+						m.chgVarUb(Course[j,t], 0)
+					else:
+						m.addCons(Course[j,t] == Course[j+1,t+1])
 
+		for k in range(len(self.I)):
+			if len(self.I_course_index[k]) < 2:
+				continue
+			for t in self.T:
+				m.addCons(quicksum(Course[j,t] for j in self.I_course_index[k]) <= 1)
+
+		if self.other_indicies != []:
+			for i in range(len(self.T)):
+				m.chgVarLb(Course[self.other_indicies[i], self.T[i]], 1)
+
+		for A, courses in self.get_room_type_sets():
+			for t in self.T:
+				m.addCons(quicksum(Course[j,t] for j in courses) <= len(A))
+
+		for periods in tried:
+			m.addCons(quicksum(Course[j,periods[j]] for j in periods)
+				<= len(periods) - 1)
+
+		# clash[j,k] is 1 if j and k are taught at the same time
+		clash = {}
+		for (j, k) in weights:
+			clash[j,k] = m.addVar(vtype="C", lb=0, ub=1)
+			for t in self.T:
+				m.addCons(clash[j,k] >= Course[j,t] + Course[k,t] - 1)
+		m.setObjective(quicksum(weights[key]*clash[key] for key in clash), "minimize")
+
+		m.optimize()
+		if m.getNSols() == 0:
+			return None
+		periods = {}
+		for j in self.C:
+			for t in self.T:
+				if m.getVal(Course[j,t]) > .5:
+					periods[j] = t
+		print("\tTimetable with", len(clash), "pairs of courses, clash weight",
+			m.getObjVal())
+		return periods
+
+	@phase
+	def greedy_start(self):
+		"""
+		Builds a schedule with `construct_schedule` (in seconds) and gives
+		it to SCIP as a starting solution. It is also kept in the value
+		dictionaries, as a fallback if the solve is stopped before SCIP
+		finds anything (S stays the types until then). The students the
+		greedy could not give a full schedule are left for SCIP to complete
+		(as in `warm_start`)
+		Call it after the constraints are added, before `optimize`
+		"""
+		self.XV, self.CourseV, self.RoomV, self.UV, incomplete = \
+			self.construct_schedule()
+
+		if incomplete == []:
+			sol = self.m.createSol()
+			for var, value in self.get_model_values().values():
+				self.m.setSolVal(sol, var, value)
+			if self.m.checkSol(sol):
+				objective = self.m.getSolObjVal(sol)
+				self.m.addSol(sol)
+				print("\tGreedy schedule added with objective", objective)
+				return
+			print("\tGreedy schedule is not feasible (MIN or symmetry constraints?)")
+		else:
+			print("\tGreedy schedule without a full schedule for", len(incomplete),
+				"students")
+		self.warm_start(self.get_solution())
+
+	def construct_schedule(self):
+		"""
+		Greedy construction heuristic, places the courses with
+		`place_courses` and then the students with `assign_students`.
+		Returns (XV, CourseV, RoomV, UV) for every student, and the list of
+		students without a full schedule (empty if it is feasible)
+		"""
+		periods = self.place_courses(self.get_conflict_weights())
+		CourseV = {}
+		for j in self.C:
+			for t in self.T:
+				CourseV[j,t] = int(periods[j] == t)
+		XV, UV, incomplete = self.assign_students(periods)
+		RoomV = self.match_rooms(CourseV)
+		return XV, CourseV, RoomV, UV, incomplete
+
+	def place_courses(self, weights):
+		"""
+		Greedy version of `schedule_courses` (same constraints and return),
+		places the `Other` courses in their periods, then the double periods
+		and then the rest by how much they clash with everything, each in
+		the period where it clashes the least (by `weights`) with the
+		courses already there. Raises ValueError if a course has no
+		period left
+		"""
+		n = len(self.C)
+		W = np.zeros((n, n))
+		for (j, k), w in weights.items():
+			W[j,k] += w
+			W[k,j] += w
+
+		sets = self.get_room_type_sets()
+		in_set = np.zeros((len(sets), n), dtype=bool) # room type set --> its courses
+		size = np.zeros(len(sets))
+		for a, (A, courses) in enumerate(sets):
+			in_set[a, courses] = True
+			size[a] = len(A)
+
+		T = list(self.T)
+		placed = np.zeros((n, len(T))) # course in period
+		busy = np.zeros((len(self.I), len(T)), dtype=bool) # teacher in period
+		load = np.zeros((len(sets), len(T))) # courses of room type set in period
+
+		periods = {}
+		for q, j in enumerate(self.other_indicies):
+			periods[j] = T[q]
+			placed[j,q] = 1
+
+		todo = [j for j in self.C if j not in periods and
+			not (j > 0 and self.Db[j-1] == 1)]
+		todo.sort(key=lambda j: (-self.Db[j], -W[j].sum()))
+		for j in todo:
+			halves = [j, j+1] if self.Db[j] == 1 else [j]
+			best = None
+			for q in range(len(T) - len(halves) + 1):
+				if self.Db[j] == 1 and T[q] in [4, 8]:
+					continue
+				slots = list(zip(halves, range(q, q + len(halves))))
+				if any(busy[self.Ta[:,c] > 0, p].any() for c, p in slots):
+					continue
+				if any((load[in_set[:,c], p] >= size[in_set[:,c]]).any()
+						for c, p in slots):
+					continue
+				# ties go to the emptier period
+				cost = sum(W[c] @ placed[:,p] for c, p in slots) + \
+					1e-3*sum(placed[:,p].sum() for c, p in slots)
+				if best is None or cost < best[0]:
+					best = (cost, slots)
+			if best is None:
+				raise ValueError("Could not find a period for " + self.Cd[j])
+
+			for c, p in best[1]:
+				periods[c] = T[p]
+				placed[c,p] = 1
+				busy[self.Ta[:,c] > 0, p] = True
+				load[in_set[:,c], p] += 1
+		return periods
+
+	def assign_students(self, periods, search_nodes=1000):
+		"""
+		Student side of `construct_schedule`, takes in course --> period and
+		puts the students in one at a time, by senority (see
+		`get_seniority`). Each gets their resource room and a course for
+		their grade level requirements first, then the courses they want by
+		preference while there is room, and the periods left are filled
+		with any other course they are eligible for (`Other` courses first),
+		within the same constraints as the model.
+		Returns (XV, UV, incomplete) for every student, with the students
+		that could not get a full schedule in incomplete
+		"""
+		T = list(self.T)
+		position = {}
+		for j in periods:
+			position[j] = T.index(periods[j])
+		left = np.where(np.isnan(self.MAX), np.inf, self.MAX).astype(float)
+
+		group_of = {}
+		for g, course_set in enumerate(self.multi_nested_list):
+			for j in course_set:
+				group_of[j] = g
+		rr_courses = set(self.RR_course_indicies.values())
+
+		# proximity coefficients that apply to each type
+		type_of = self.get_type_of()
+		proximity = {}
+		for k in self.type_members:
+			proximity[k] = []
+			for subject in self.num_courses.keys():
+				coef = self.get_proximity_coefficients(subject)
+				if coef is None:
+					continue
+				proximity[k].append(coef)
+
+		XV = {}
+		UV = {}
+		incomplete = []
+		students = sorted(self.all_S, key=lambda i: -self.get_seniority(i))
+		for i in students:
+			k = type_of[i]
+			eligible = set(self.S_C_dict[k])
+			own_rr = [self.RR_course_indicies[r] for r in ["RR1", "RR2", "RR3"]
+				if i in self.RR_student_dict[r]]
+			required = [set(self.get_requirement_courses(req)) for req in self.requirements
+				if self.student_dict[i].grade == req.grade]
+			slot = [None]*len(T)
+			groups = set()
+			counts = np.zeros(len(proximity[k]))
+
+			def halves(j):
+				return [j, j+1] if self.Db[j] == 1 else [j]
+
+			def can_take(j):
+				if j in rr_courses and j not in own_rr:
+					return False
+				for c in halves(j):
+					if c not in eligible or slot[position[c]] is not None or left[c] < 1:
+						return False
+				if group_of.get(j) in groups:
+					return False
+				if any(j in courses and courses.intersection(slot)
+						for courses in required):
+					return False # exactly one of the requirement courses
+				for a, coef in enumerate(proximity[k]):
+					if counts[a] + sum(coef[c] for c in halves(j)) > 2:
+						return False
+				return True
+
+			def take(j, sign=1):
+				# (sign -1 takes the student back out)
+				for c in halves(j):
+					slot[position[c]] = c if sign == 1 else None
+					left[c] -= sign
+				if j in group_of:
+					if sign == 1:
+						groups.add(group_of[j])
+					else:
+						groups.discard(group_of[j])
+				for a, coef in enumerate(proximity[k]):
+					counts[a] += sign*sum(coef[c] for c in halves(j))
+
+			def is_full():
+				return None not in slot and all(courses.intersection(slot)
+					for courses in required)
+
+			def search(q, nodes):
+				# fills the periods from q on with the first schedule found,
+				# trying each period's courses by preference
+				while q < len(T) and slot[q] is not None:
+					q += 1
+				if q == len(T):
+					return is_full()
+				if nodes[0] == 0:
+					return False
+				nodes[0] -= 1
+				for j in options[q]:
+					if can_take(j):
+						take(j)
+						if search(q + 1, nodes):
+							return True
+						take(j, -1)
+				return False
+
+			# courses by the period they start in, the wanted ones first
+			# by preference, then `Other` courses, then the emptiest
+			first_halves = [j for j in sorted(eligible) if not (j > 0 and self.Db[j-1] == 1)]
+			options = [[] for q in T]
+			for j in first_halves:
+				options[position[j]].append(j)
+			for q in range(len(T)):
+				options[q].sort(key=lambda j: (-self.P[i][j],
+					j not in self.other_indicies, -left[j]))
+
+			for j in own_rr:
+				if can_take(j):
+					take(j)
+			for courses in required:
+				for j in sorted(courses, key=lambda j: -self.P[i][j]):
+					if can_take(j):
+						take(j)
+						break
+
+			wanted = [j for j in first_halves if self.P[i][j] > 0]
+			for j in sorted(wanted, key=lambda j: -self.P[i][j]):
+				if can_take(j):
+					take(j)
+
+			# the greedy choices can block each other (a double and a
+			# section in the way), then search for any full schedule,
+			# and failing that keep the greedy one as full as it gets
+			if not search(0, [search_nodes]):
+				greedy = [j for j in first_halves if j in slot]
+				for j in greedy:
+					take(j, -1)
+				for j in own_rr:
+					if can_take(j):
+						take(j)
+				if not search(0, [search_nodes]):
+					for j in greedy:
+						if j not in slot and can_take(j):
+							take(j)
+					for q in range(len(T)):
+						for j in options[q]:
+							if can_take(j):
+								take(j)
+
+			if not is_full():
+				incomplete.append(i)
+			for j in self.C:
+				XV[i,j] = int(j in slot)
+				for t in self.T:
+					UV[i,j,t] = XV[i,j]*int(periods[j] == t)
+
+		print("\tGreedy placed", len(students) - len(incomplete), "of", len(students),
+			"students with a full schedule")
+		return XV, UV, incomplete
+
+	def create_model(self):
+		"""
+		Returns a new SCIP model with the parameters that are set from the
+		options (symmetry)
+		"""
+		m = Model()
+		if self.symmetry is not None:
+			m.setIntParam("misc/usesymmetry", self.symmetry)
+		return m
+
+	def get_cache_key(self):
+		"""
+		Returns a hash of everything the model is built from, the input
+		data (prefs, LP_input, teacher, prox, rr_df, requirements, and the
+		student grades and ids), the formulation options and the source of
+		this file (so a changed model is never read from an old cache)
+		GAP is left out, it is set after reading
+		"""
+		h = hashlib.sha256()
+		for df in [self.prefs, self.df, self.teacher, self.prox, self.rr_df]:
+			if df is None:
+				h.update(b"None")
+				continue
+			h.update(str(list(df.columns)).encode())
+			h.update(pd.util.hash_pandas_object(df).values.tobytes())
+
+		for req in (self.requirements or []):
+			h.update(str((req.grade, req.course1, req.course2)).encode())
+		for i in self.all_S:
+			student = self.student_dict[i]
+			h.update(str((i, student.grade, student.s_id)).encode())
+		h.update(str(sorted(self.num_courses.keys())).encode())
+
+		options = (self.sparse, self.rooms_post_solve, self.linking,
+			self.alias_doubles, self.fix_bounds, self.student_types, self.symmetry,
+			sorted((self.seniority or {}).items()))
+		h.update(str(options).encode())
+		h.update(open(__file__, "rb").read())
+		return h.hexdigest()
+
+	def get_cache_files(self):
+		"""
+		Returns the paths of the cached model (CIP) and its index (JSON)
+		"""
+		at = self.cache_dir + "/" + self.get_cache_key()
+		return at + ".cip", at + ".json"
+
+	def save_model(self):
+		"""
+		Writes the built model to `cache_dir`, with an index mapping each
+		entry of X, Course, U and Rv to its variable name (or constant,
+		for fixed and aliased entries) and the `add_*` calls made
+		(not with `lazy`, the lazy rows would be missing)
+		"""
+		if self.lazy:
+			return
+		os.makedirs(self.cache_dir, exist_ok=True)
+		model_file, index_file = self.get_cache_files()
+
+		index = {"calls":self.model_calls}
+		for kind, variables in [("X", self.X), ("Course", self.Course),
+				("U", self.U), ("Rv", self.Rv)]:
+			entries = []
+			for key, var in variables.items():
+				key = [k if isinstance(k, str) else int(k) for k in key]
+				if self.is_constant(var):
+					entries.append([key, var])
+				else:
+					entries.append([key, var.name])
+			index[kind] = entries
+
+		self.m.writeProblem(model_file)
+		with open(index_file, "w") as f:
+			json.dump(index, f)
+		print("Model saved to", model_file)
+
+	def load_model(self):
+		"""
+		Reads the model from `cache_dir` if it was built from the same
+		inputs (see `get_cache_key`), and fills X, Course, U and Rv from
+		the index. Returns True if it was read
+		"""
+		if self.cache_dir is None or self.lazy:
+			return False # (the lazy rows are not in the model file)
+		model_file, index_file = self.get_cache_files()
+		if not (os.path.exists(model_file) and os.path.exists(index_file)):
+			return False
+
+		self.m.readProblem(model_file)
+		with open(index_file) as f:
+			index = json.load(f)
+		by_name = {}
+		for var in self.m.getVars():
+			by_name[var.name] = var
+
+		for kind in ["X", "Course", "U", "Rv"]:
+			variables = {}
+			for key, value in index[kind]:
+				if isinstance(value, str):
+					value = by_name[value]
+				variables[tuple(key)] = value
+			setattr(self, kind, variables)
+
+		self.from_cache = True
+		self.cached_calls = index["calls"]
+		print("Model read from", model_file)
+		return True
+
+	def check_model_calls(self):
+		"""
+		Makes sure a model read from cache is used with the same `add_*`
+		calls it was built with
+		"""
+		if self.model_calls != self.cached_calls:
+			raise ValueError("The cached model was built with " +
+				str(self.cached_calls) + " not " + str(self.model_calls))
+
+	def get_model_size(self):
+		"""
+		Returns the number of (variables, constraints) in the model
+		(of the original problem, so also after solving), (0, 0) before
+		the model is created
+		"""
+		if not hasattr(self, "m"):
+			return 0, 0
+		return self.m.getNVars(False), self.m.getNConss(False)
+
+	def count_nonzeros(self, first=0):
+		"""
+		Returns the number of non-zeros in the linear constraints from
+		index `first` on (the rows held by `LazyRows` are not counted)
+		"""
+		if not hasattr(self, "m"):
+			return 0
+		conss = self.m.getConss(False)[first:]
+		return int(sum(len(self.m.getValsLinear(c)) for c in conss
+			if c.getConshdlrName() == "linear"))
+
+	def save_build_report(self, file_name="build_report.json"):
+		"""
+		Saves `build_report` (with the model size) as JSON in `save_location`
+		"""
+		report = {"students":len(self.S), "courses":len(self.C),
+			"variables":self.get_model_size()[0],
+			"constraints":self.get_model_size()[1],
+			"seconds":sum(record["seconds"] for record in self.build_report),
+			"phases":self.build_report}
+		f = file_name
+		if self.save_location is not None:
+			f = self.save_location + "/" + f
+		with open(f, "w") as out:
+			json.dump(report, out, indent=4)
+
+	def get_lp_bound(self, time_limit=None):
+		"""
+		Solves the LP relaxation of the built model (on a copy, so the
+		model itself is untouched) and returns its bound on the objective,
+		or None if `time_limit` stopped it before the LP was solved (or
+		the model is infeasible)
+		"""
+		lp = Model(sourceModel=self.m)
+		for v in lp.getVars():
+			lp.chgVarType(v, "C")
+		lp.hideOutput()
+		if time_limit is not None:
+			lp.setRealParam('limits/time', time_limit)
+		lp.optimize()
+		bound = lp.getDualbound()
+		if lp.isInfinity(abs(bound)):
+			return None
+		return bound
+
+	def get_assignment_bound(self, time_limit=None):
+		"""
+		Returns a bound on the objective that leaves out the periods and
+		rooms: the best assignment of students to courses under MAX, where
+		each student takes up to one course a period (less their resource
+		room), at most one section of a multi-instance course and at most
+		one of the courses of a grade level requirement. Only the preference
+		terms of the objective count (the `Other` terms are <= 0)
+
+		This is a min-cost flow (source -> student -> section group ->
+		course -> sink), written as its LP, which has an integer optimum
+		as the student side is nested and the course side is one row per
+		course, so SCIP solves it at the root. Returns None if `time_limit`
+		stopped it before then
+		"""
+		m = Model()
+		m.hideOutput()
+		if time_limit is not None:
+			m.setRealParam('limits/time', time_limit)
+
+		P2 = self.get_preference_scores()
+		mini = range(len(self.C) - 3)
+
+		flow = {} # (student, course) --> flow (students of the type)
+		for i in self.S:
+			for j in self.S_C_dict[i]:
+				if j in mini and P2[i][j] > 0 and not self.is_constant(self.X[i,j]):
+					flow[i,j] = m.addVar(vtype="C", lb=0, ub=self.type_size[i],
+						obj=self.get_seniority(i)*P2[i][j])
+
+		for i in self.S:
+			courses = [j for j in self.S_C_dict[i] if (i,j) in flow]
+			if courses == []:
+				continue
+			rr = [r for r in ["RR1", "RR2", "RR3"] if i in self.RR_student_dict[r]]
+			m.addCons(quicksum(flow[i,j] for j in courses)
+				<= self.type_size[i]*(len(self.T) - len(rr)))
+			for course_set in self.multi_nested_list:
+				sections = [flow[i,j] for j in course_set if (i,j) in flow]
+				if len(sections) > 1:
+					m.addCons(quicksum(sections) <= self.type_size[i])
+			for req in self.requirements:
+				if self.student_dict[i].grade == req.grade:
+					multi = [flow[i,j] for j in self.get_requirement_courses(req)
+						if (i,j) in flow]
+					if len(multi) > 1:
+						m.addCons(quicksum(multi) <= self.type_size[i])
+
+		for j in self.C:
+			if np.isnan(self.MAX[j]):
+				continue
+			students = [flow[i,j] for i in self.C_S_dict[j] if (i,j) in flow]
+			if students != []:
+				m.addCons(quicksum(students) <= self.MAX[j])
+
+		m.setMaximize()
+		m.optimize()
+		bound = m.getDualbound()
+		if m.isInfinity(abs(bound)):
+			return None
+		return bound
+
+	@phase
+	def estimate(self, time_limit=10):
+		"""
+		Returns upper bounds on the objective in seconds, to see how good a
+		schedule can be before a long solve, as a dictionary
+			LP - the LP relaxation of the built model (`get_lp_bound`)
+			assignment - without periods and rooms (`get_assignment_bound`)
+			best - the smaller of the two
+		each given `time_limit` seconds (a stopped solve still gives a
+		bound, just a weaker one, unless it stopped before the LP was
+		solved, then the bound is None and `best` is the other one, None if
+		neither was found). A schedule within a gap of `best` is at least as
+		close to the best schedule there is
+		Call it after the constraints are added, before `optimize`
+		"""
+		bounds = {"LP":self.get_lp_bound(time_limit),
+			"assignment":self.get_assignment_bound(time_limit)}
+		found = [bound for bound in bounds.values() if bound is not None]
+		bounds["best"] = min(found) if found != [] else None
+		print("\tBound on the objective:", bounds["best"], "(LP", bounds["LP"],
+			", without periods", bounds["assignment"], ")")
+		return bounds
+
+	def get_student_scores(self):
+		"""
+		Once the value dictionaries are filled in (see `assign_value_dicts`),
+		returns a DataFrame with a row per student: their grade, the
+		preference score of their schedule (as in the objective, without
+		the seniority multiplier), and how many of their first choices they
+		asked for and got (a double period counts once)
+		"""
+		P2 = self.get_preference_scores()
+		rows = []
+		for i in self.all_S:
+			score = sum(P2[i][j]*self.XV[i,j] for j in self.C)
+			first = [j for j in self.C if self.P[i][j] == 3 and
+				not (j > 0 and self.Db[j-1] == 1)]
+			rows.append({"student":i, "grade":self.student_dict[i].grade,
+				"score":score, "first choices":len(first),
+				"first choices given":sum(self.XV[i,j] for j in first)})
+		return pd.DataFrame(rows).set_index("student")
+
+	@phase
 	def assign_value_dicts(self):
 		"""
 		Once the optimization is completed, call this function
@@ -940,20 +3492,34 @@ class Optimizer():
 			CourseV
 			RV
 			UV
+		(S is set to all of the students, for student types)
+		"""
+		self.XV, self.CourseV, self.RoomV, self.UV = self.get_value_dicts()
+		self.S = self.all_S
+
+	def get_value_dicts(self):
+		"""
+		Returns the value dictionaries (XV, CourseV, RoomV, UV) of the best
+		solution so far, without changing anything (see `assign_value_dicts`)
 		"""
 		XV = {}
 		CourseV = {}
 		for i in self.S:
 			for j in range(len(self.C)):
-				# get student variable
-				XV[i,j] = self.get_value(self.X[i,j])
+				# get student variable (0 if the student was not eligible)
+				if (i, j) in self.X:
+					XV[i,j] = self.get_value(self.X[i,j])
+				else:
+					XV[i,j] = 0
 				for t in self.T:
 					CourseV[j,t] = self.get_value(self.Course[j,t])
 		# get rooms
 		RoomV = {}
 		# for j in range(len(C)):
-		#for j in self.c_mini: #<------ when there are other courses included
-		for j in self.C:
+		#for j in self.C:
+		for j in self.c_mini:
+			if self.rooms_post_solve:
+				break
 			for s in self.R:
 				for t in self.T:
 					RoomV[j,s,t] = self.get_value(self.Rv[j,s,t])
@@ -962,22 +3528,121 @@ class Optimizer():
 		for i in self.S:
 			for j in self.Cd:
 				for t in self.T:
-					UV[i,j,t] = self.get_value(self.U[i,j,t])
+					if (i, j, t) in self.U:
+						UV[i,j,t] = self.get_value(self.U[i,j,t])
+					else:
+						UV[i,j,t] = 0
+
+		# the values above are counts for each type, split into students
+		if self.student_types:
+			XV, UV = self.split_types(XV, CourseV)
+
+		# rooms were left out of the ILP
+		if self.rooms_post_solve:
+			RoomV = self.match_rooms(CourseV)
+
+		return XV, CourseV, RoomV, UV
 
-		# assign fields
-		self.XV = XV
-		self.CourseV = CourseV
-		self.RoomV = RoomV
-		self.UV = UV
 
+	def split_types(self, XV, CourseV):
+		"""
+		Takes in the type counts XV[first student of type, course] and the
+		course periods, and returns XV and UV for every student (see
+		`split_type`)
+		"""
+		XV_all = {}
+		UV_all = {}
+		for k in self.S:
+			members = self.type_members[k]
+			if len(members) == 1:
+				taken = {(k,j):XV[k,j] for j in self.C}
+			else:
+				taken = self.split_type(k, XV, CourseV)
+			for i in members:
+				for j in self.C:
+					XV_all[i,j] = taken.get((i,j), 0)
+					for t in self.T:
+						UV_all[i,j,t] = XV_all[i,j]*CourseV[j,t]
+
+		return XV_all, UV_all
+
+	def split_type(self, k, XV, CourseV):
+		"""
+		Splits the count XV[k,j] of each course between the students of the
+		type of student k with a small ILP, so each of them has one course
+		a period and meets the constraints that the type only meets in
+		total (both halves of a double, one section of a multi-instance
+		course, proximity and grade level requirements)
+		Returns (student, course) --> 1 for the courses each one takes
+		"""
+		members = self.type_members[k]
+		courses = [j for j in self.C if XV[k,j] > 0]
+
+		m = Model()
+		m.hideOutput()
+		A = {}
+		for i in members:
+			for j in courses:
+				A[i,j] = m.addVar(vtype="B")
+
+		# everyone the type had in the course
+		for j in courses:
+			m.addCons(quicksum(A[i,j] for i in members) == XV[k,j])
+
+		for i in members:
+			# one course per period
+			for t in self.T:
+				m.addCons(quicksum(A[i,j] for j in courses if CourseV[j,t] == 1) == 1)
+
+			# both halves of doubles
+			for j in courses:
+				if self.Db[j] == 1 and j+1 in courses:
+					m.addCons(A[i,j+1] == A[i,j])
+
+			# one section of multi-instance courses
+			for course_set in self.multi_nested_list:
+				sections = [A[i,j] for j in course_set if j in courses]
+				if len(sections) > 1:
+					m.addCons(quicksum(sections) <= 1)
+
+			# proximity (same rows as `add_proximity_constraints`)
+			for subject in self.num_courses.keys():
+				coef = self.get_proximity_coefficients(subject)
+				if coef is None:
+					continue
+				terms = [float(coef[j])*A[i,j] for j in courses if coef[j] != 0]
+				if terms != []:
+					m.addCons(quicksum(terms) <= 2)
+
+			# grade level requirements
+			for req in self.requirements:
+				if self.student_dict[k].grade == req.grade:
+					multi = self.get_requirement_courses(req)
+					m.addCons(quicksum(A[i,j] for j in multi if j in courses) == 1)
+
+		m.optimize()
+		if m.getNSols() == 0:
+			raise ValueError("Could not split the type of student " + str(k) +
+				" into schedules")
+
+		taken = {}
+		for (i,j) in A.keys():
+			if m.getVal(A[i,j]) > .5:
+				taken[i,j] = 1
+		return taken
 
 	def get_value(self, var):
 		"""
 		Takes in a variable, and if the model is done running,
 		will return the value.
 		Deals with SCIP being weird about binary variables
+		(also takes the constant 0's used for aliased double periods)
 		"""
+		if isinstance(var, (int, float)):
+			return int(var)
 		v = self.m.getVal(var)
+		if var.vtype() == "INTEGER":
+			return int(round(v)) # count of a student type
 		if v < 0.75:
 			return 0
 		else:
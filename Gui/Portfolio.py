@@ -0,0 +1,169 @@
+# Portfolio
+# Spring 2018
+
+"""
+Contains the worker side of `Optimizer.portfolio`: each worker process
+reads the written model, solves it with its own settings (random seed,
+emphasis, ...) and shares the solutions it finds with the other workers
+through files in a common directory (a queue would not be sent on while
+SCIP is running)
+"""
+
+from pyscipopt import Model, Heur, Eventhdlr, SCIP_RESULT, SCIP_HEURTIMING, \
+	SCIP_EVENTTYPE, SCIP_PARAMEMPHASIS
+import os
+import pickle
+
+
+# the default settings of the workers, in the order they are started
+PORTFOLIO = [{"seed":0, "emphasis":None},
+			{"seed":1, "emphasis":"feasibility"},
+			{"seed":2, "emphasis":"optimality"},
+			{"seed":3, "emphasis":None, "symmetry":0},
+			{"seed":4, "emphasis":"feasibility"},
+			{"seed":5, "emphasis":None},
+			{"seed":6, "emphasis":"optimality"},
+			{"seed":7, "emphasis":None, "symmetry":0}]
+
+EMPHASIS = {"feasibility":SCIP_PARAMEMPHASIS.FEASIBILITY,
+			"optimality":SCIP_PARAMEMPHASIS.OPTIMALITY}
+
+
+def check_settings(settings):
+	"""
+	Raises a ValueError if one of the worker settings has an unknown key
+	or emphasis (checked before the workers start, an error in a worker
+	only shows up as its status)
+	"""
+	for n, setting in enumerate(settings):
+		for key in setting:
+			if key not in ["seed", "emphasis", "symmetry"]:
+				raise ValueError("Unknown setting " + str(key) + " for worker " +
+					str(n) + ", must be one of seed, emphasis, symmetry")
+		emphasis = setting.get("emphasis")
+		if emphasis is not None and emphasis not in EMPHASIS:
+			raise ValueError("Unknown emphasis " + repr(emphasis) + " for worker " +
+				str(n) + ", must be None or one of " + ", ".join(EMPHASIS))
+
+
+def get_solution_file(directory, worker):
+	"""
+	Returns the path of the file with the best solution of `worker`
+	"""
+	return os.path.join(directory, "solution" + str(worker) + ".pkl")
+
+
+def read_solutions(directory):
+	"""
+	Returns the (objective, variable name --> value) of every worker
+	that has found a solution so far
+	"""
+	solutions = []
+	for file_name in sorted(os.listdir(directory)):
+		if file_name.startswith("solution") and file_name.endswith(".pkl"):
+			solutions.append(pickle.load(open(os.path.join(directory, file_name), "rb")))
+	return solutions
+
+
+class SharedSolutions(Heur):
+	"""
+	Heuristic that tries the solutions of the other workers (before and
+	after each node and in the root LP loop, which can take a while),
+	whenever one of their files changed and has a better objective
+	"""
+	def __init__(self, directory, worker):
+		self.directory = directory
+		self.worker = worker
+		self.seen = {} # file --> modification time when it was last read
+
+	def heurexec(self, heurtiming, nodeinfeasible):
+		result = SCIP_RESULT.DIDNOTRUN
+		for file_name in os.listdir(self.directory):
+			path = os.path.join(self.directory, file_name)
+			if not file_name.startswith("solution") or not file_name.endswith(".pkl") \
+				or path == get_solution_file(self.directory, self.worker):
+				continue
+			changed = os.path.getmtime(path)
+			if self.seen.get(path) == changed:
+				continue
+			self.seen[path] = changed
+			objective, values = pickle.load(open(path, "rb"))
+			sense = 1 if self.model.getObjectiveSense() == "maximize" else -1
+			if self.model.getNSols() > 0 and \
+				sense*objective <= sense*self.model.getPrimalbound() + 1e-6:
+				continue # not better than what this worker has
+
+			# in the original space, this worker's presolve may have
+			# fixed variables the other way
+			sol = self.model.createOrigSol(self)
+			for var in self.model.getVars(transformed=False):
+				if var.name in values:
+					self.model.setSolVal(sol, var, values[var.name])
+			result = SCIP_RESULT.FOUNDSOL if self.model.trySol(sol) \
+				else SCIP_RESULT.DIDNOTFIND
+		return {"result":result}
+
+
+class NewSolutions(Eventhdlr):
+	"""
+	Event handler that writes each new best solution of the worker to its
+	file, as (objective, variable name --> value)
+	"""
+	def __init__(self, directory, worker):
+		self.directory = directory
+		self.worker = worker
+
+	def eventinit(self):
+		self.model.catchEvent(SCIP_EVENTTYPE.BESTSOLFOUND, self)
+
+	def eventexit(self):
+		self.model.dropEvent(SCIP_EVENTTYPE.BESTSOLFOUND, self)
+
+	def eventexec(self, event):
+		sol = self.model.getBestSol()
+		values = {}
+		for var in self.model.getVars(transformed=False):
+			values[var.name] = round(self.model.getSolVal(sol, var))
+
+		# written aside first, so a file is never read half way
+		path = get_solution_file(self.directory, self.worker)
+		pickle.dump((self.model.getSolObjVal(sol), values), open(path + ".tmp", "wb"),
+			pickle.HIGHEST_PROTOCOL)
+		os.replace(path + ".tmp", path)
+
+
+def solve_worker(worker, file_name, settings, gap, time_limit, directory, outbox):
+	"""
+	Runs in a worker process, reads the model from `file_name`, applies
+	the worker's settings (see PORTFOLIO) and solves it, then puts
+	(worker, status, objective, dual bound) in the outbox. It always puts
+	one, on an error the status is "error (...)" and the rest None
+	"""
+	status, objective, bound = "error", None, None
+	try:
+		m = Model()
+		m.hideOutput()
+		m.readProblem(file_name)
+		if settings.get("emphasis") is not None:
+			m.setEmphasis(EMPHASIS[settings["emphasis"]])
+		if settings.get("symmetry") is not None:
+			m.setIntParam("misc/usesymmetry", settings["symmetry"])
+		m.setIntParam("randomization/randomseedshift", settings.get("seed", 0))
+		m.setRealParam("limits/gap", gap)
+		if time_limit is not None:
+			m.setRealParam("limits/time", time_limit)
+
+		m.includeHeur(SharedSolutions(directory, worker), "shared",
+			"solutions of the other workers", "Y",
+			timingmask=SCIP_HEURTIMING.BEFORENODE | SCIP_HEURTIMING.DURINGLPLOOP |
+			SCIP_HEURTIMING.AFTERLPNODE, freq=1)
+		m.includeEventhdlr(NewSolutions(directory, worker), "share",
+			"writes new best solutions for the other workers")
+		m.optimize()
+
+		objective = m.getObjVal() if m.getNSols() > 0 else None
+		status, bound = m.getStatus(), m.getDualbound()
+	except Exception as e:
+		status = "error (" + type(e).__name__ + ": " + str(e) + ")"
+	finally:
+		outbox.put((worker, status, objective, bound))
@@ -0,0 +1,189 @@
+# Sweep
+# Spring 2018
+
+"""
+Runs an instance under a grid of scenarios (GAP, seniority multipliers,
+requirement sets and MAX overrides) in worker processes, and collects
+the results of each run in one table, to compare policies in one batch
+instead of one run at a time
+"""
+
+import contextlib
+import copy
+import itertools
+import multiprocessing
+import os
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from benchmark import *
+
+
+# the scenario parameters and what a run gets when one is left out
+# (None keeps the instance's own requirements and MAX)
+DEFAULTS = {"GAP":.3, "seniority":None, "requirements":None, "MAX":None}
+
+
+def get_scenarios(grid):
+	"""
+	Takes in a dictionary parameter --> list of values (parameters from
+	DEFAULTS) and returns the list of scenario dictionaries, one for every
+	combination
+	"""
+	for name in grid:
+		if name not in DEFAULTS:
+			raise ValueError("Unknown scenario parameter " + str(name) +
+				", must be one of " + ", ".join(DEFAULTS))
+	names = list(DEFAULTS)
+	values = [grid.get(name, [DEFAULTS[name]]) for name in names]
+	return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+def check_scenarios(instance, scenarios):
+	"""
+	Raises a ValueError if a scenario has an unknown parameter, a
+	requirement that is not a Requirement or a MAX override for a course
+	that is not in the instance's LP input (checked
+	before anything runs, so the sweep doesn't stop half way)
+	"""
+	names = set(instance["LP_input"]["Course Name"])
+	for n, scenario in enumerate(scenarios):
+		for name in scenario:
+			if name not in DEFAULTS:
+				raise ValueError("Unknown parameter " + str(name) + " in scenario " +
+					str(n) + ", must be one of " + ", ".join(DEFAULTS))
+		for req in (scenario.get("requirements") or []):
+			if not isinstance(req, Requirement):
+				raise ValueError("The requirements of scenario " + str(n) +
+					" must be Requirements, not " + repr(req))
+		for name in (scenario.get("MAX") or {}):
+			if name not in names:
+				raise ValueError("There is no course " + str(name) +
+					" in the LP input (MAX of scenario " + str(n) + ")")
+
+
+def apply_scenario(instance, scenario):
+	"""
+	Returns a copy of the instance dictionary with the scenario's
+	requirements and MAX overrides (course name --> MAX, for every section
+	with that name) put in
+	"""
+	instance = dict(instance)
+	if scenario.get("requirements") is not None:
+		instance["requirements"] = list(scenario["requirements"])
+	if scenario.get("MAX") is not None:
+		LP_input = instance["LP_input"].copy()
+		for name, size in scenario["MAX"].items():
+			rows = LP_input["Course Name"] == name
+			if not rows.any():
+				raise ValueError("There is no course " + str(name) + " in the LP input")
+			LP_input.loc[rows, "Max"] = size
+		instance["LP_input"] = LP_input
+	return instance
+
+
+def describe(scenario):
+	"""
+	Returns the scenario as short strings for the results table
+	"""
+	requirements = scenario.get("requirements")
+	if requirements is not None:
+		requirements = "; ".join(str(req.grade) + ": " + " or ".join(str(name)
+			for name in [req.course1, req.course2] if name is not None)
+			for req in requirements)
+	return {"GAP":scenario.get("GAP", DEFAULTS["GAP"]),
+		"seniority":None if scenario.get("seniority") is None
+			else str(scenario["seniority"]),
+		"requirements":requirements,
+		"MAX":None if scenario.get("MAX") is None else str(scenario["MAX"])}
+
+
+def run_scenario(number, instance, scenario, time_limit, greedy):
+	"""
+	Runs in a worker process, builds and solves the instance under the
+	scenario (from the greedy schedule if `greedy`) and returns the row of
+	the results table: the status, objective, solve time (and run time
+	with the build), first choice rate and mean score of the students in
+	each grade
+	"""
+	row = {"scenario":number}
+	row.update(describe(scenario))
+	start = timeit.default_timer()
+	try:
+		# the Optimizer prints as it goes, which would mix between workers
+		with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+			O = build_optimizer(apply_scenario(instance, scenario),
+				GAP=scenario.get("GAP", DEFAULTS["GAP"]),
+				seniority=scenario.get("seniority"))
+			if greedy:
+				try:
+					O.greedy_start()
+				except ValueError:
+					pass
+			row.update(solve(O, time_limit))
+			if O.m.getNSols() > 0:
+				O.assign_value_dicts()
+	except InputError as e:
+		row.update({"status":"bad input", "error":str(e)})
+		return row
+	except Exception as e:
+		# one bad scenario should not take the finished ones with it
+		row.update({"status":"failed", "error":type(e).__name__ + ": " + str(e)})
+		return row
+	row["run time"] = timeit.default_timer() - start
+
+	if O.m.getNSols() > 0:
+		scores = O.get_student_scores()
+		asked = scores["first choices"].sum()
+		row["first choice rate"] = scores["first choices given"].sum()/asked \
+			if asked > 0 else np.nan
+		for grade, score in scores.groupby("grade")["score"].mean().items():
+			row["grade " + str(grade) + " score"] = score
+	return row
+
+
+def _run_scenario(args):
+	return run_scenario(*args)
+
+
+def sweep(instance, grid=None, scenarios=None, workers=2, time_limit=600,
+		greedy=True):
+	"""
+	Runs the instance (a dictionary from one of the `benchmark` loaders)
+	under every scenario of `grid` (see `get_scenarios`), or the given
+	list of `scenarios`, with `workers` processes at once and `time_limit`
+	seconds for each solve. With `greedy` every solve starts from the
+	greedy schedule, so a run that is stopped still has one.
+
+	Returns a DataFrame with a row per scenario (see `run_scenario`),
+	a scenario whose inputs can't give a schedule has the status
+	"bad input" and the problems as its "error", any other error in a run
+	gives the status "failed" (the scenarios are checked up front, see
+	`check_scenarios`)
+	"""
+	if scenarios is None:
+		scenarios = get_scenarios(grid or {})
+	scenarios = [copy.deepcopy(scenario) for scenario in scenarios]
+	check_scenarios(instance, scenarios)
+
+	print("Sweep of", len(scenarios), "scenarios with", workers, "workers")
+	# (spawned, the workers must not share SCIP with this process)
+	context = multiprocessing.get_context("spawn")
+	rows = []
+	with context.Pool(workers, maxtasksperchild=1) as pool:
+		args = [(n, instance, scenario, time_limit, greedy)
+			for n, scenario in enumerate(scenarios)]
+		for row in pool.imap_unordered(_run_scenario, args):
+			print("\tScenario", row["scenario"], "done (" + str(row["status"]) + ")",
+				"objective", row.get("objective"))
+			rows.append(row)
+
+	return pd.DataFrame(rows).sort_values("scenario").reset_index(drop=True)
+
+
+if __name__ == "__main__":
+	results = sweep(load_opt_test_files(), {"GAP":[.1, .3],
+		"seniority":[None, {6:1, 7:1, 8:1, 11:1, 12:1}]}, time_limit=300)
+	print(results)
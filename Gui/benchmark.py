@@ -0,0 +1,465 @@
+# benchmark.py
+# Spring 2018
+
+"""
+Loads the reference inputs that live in the repository as named instances
+(in the same form the GUI hands them to the Optimizer), compares
+formulation options on them, and runs them all as a benchmark that is
+checked against a saved baseline (`run_benchmark`, `compare_to_baseline`)
+
+	python benchmark.py [instance ...]
+
+runs the benchmark, the first run is saved as the baseline
+"""
+
+import contextlib
+import multiprocessing
+import os
+import sys
+import timeit
+
+try:
+	import resource # peak memory of the runs, not on Windows
+except ImportError:
+	resource = None
+
+import numpy as np
+import pandas as pd
+
+from Optimizer import *
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESOURCES = os.path.join(HERE, "..", "Resources")
+RESULTS_FILE = os.path.join(HERE, "benchmark_results.csv")
+BASELINE_FILE = os.path.join(HERE, "benchmark_baseline.csv")
+
+
+def add_rr_rows(LP_input, prefs, prox):
+	"""
+	Older inputs were made before the resource rooms were added, this
+	appends the RR1-RR3 rows (as `clean_data.create_LP_input` does), with
+	matching empty preference columns and proximity rows
+	"""
+	for name in ["RR1", "RR2", "RR3"]:
+		if name in list(LP_input["Course Name"]):
+			continue
+		row = pd.DataFrame({"Course Name":[name], "Room Type":["Resource"]})
+		LP_input = pd.concat([LP_input, row], ignore_index=True, sort=False)
+		prefs[name] = np.zeros(prefs.shape[0], dtype=int)
+		p_row = pd.DataFrame({prox.columns[0]:[name]})
+		prox = pd.concat([prox, p_row], ignore_index=True, sort=False).fillna(0)
+	return LP_input, prefs, prox
+
+
+def load_opt_test_files():
+	"""
+	The small test instance in `OptTestFiles` (the `2` versions of the
+	files are the ones in the current input format)
+	"""
+	at = os.path.join(HERE, "OptTestFiles")
+	LP_input = pd.read_csv(at + "/LP_input2.csv", index_col=0).reset_index(drop=True)
+	teacher = pd.read_csv(at + "/teacher2.csv", index_col=0)
+	prefs = pd.read_csv(at + "/prefs2.csv", index_col=0).reset_index(drop=True)
+	prox = pd.read_csv(at + "/prox2.csv")
+	grades = pd.read_csv(at + "/grades.csv")
+
+	LP_input, prefs, prox = add_rr_rows(LP_input, prefs, prox)
+
+	student_dict = {}
+	for i in prefs.index:
+		student_dict[i] = Student(s_id=i, grade=grades["1"][i])
+
+	num_courses = {}
+	for subject in list(prox.columns)[1:]:
+		num_courses[subject] = pd.Series(np.zeros(prefs.shape[0]))
+
+	return {"prefs":prefs, "LP_input":LP_input, "teacher":teacher,
+		"student_dict":student_dict, "num_courses":num_courses,
+		"rr_df":pd.DataFrame(columns=["RR1", "RR2", "RR3"]),
+		"requirements":[], "prox":prox}
+
+
+def load_real_data():
+	"""
+	The 2018 course data in `Resources/real_data`, with the 2018-19
+	preference forms (the processed preferences line up with its LP input)
+	"""
+	at = os.path.join(RESOURCES, "real_data")
+	forms = os.path.join(RESOURCES, "18_19")
+	LP_input = pd.read_csv(at + "/LP_Input.csv")
+	teacher = pd.read_csv(at + "/Teacher_Template_filled.csv")
+	prox = pd.read_csv(at + "/Proximity.csv")
+	rr_df = pd.read_csv(at + "/resource_room.csv")
+	prefs = pd.read_csv(forms + "/processed_preference_data.csv", index_col=0)
+	hs_prefs = pd.read_csv(forms + "/School form - High School form responses.csv",
+		index_col=0)
+	ms_prefs = pd.read_csv(forms + "/School form - Middle School form responses.csv",
+		index_col=0)
+
+	student_dict = metadata(hs_prefs, ms_prefs)
+	num_courses = get_num_courses(LP_input, hs_prefs, ms_prefs)
+	requirements = [Requirement(6, "People and Literature", "Inquiry and Tools"),
+		Requirement(9, 'African Studies', 'Latin American Literature')]
+
+	return {"prefs":prefs, "LP_input":LP_input, "teacher":teacher,
+		"student_dict":student_dict, "num_courses":num_courses,
+		"rr_df":rr_df, "requirements":requirements, "prox":prox}
+
+
+def load_gui_test_files():
+	"""
+	The inputs the GUI wrote out for debugging (`test_*.csv`, two
+	students), the files have no grades so the students are put in 9th
+	"""
+	LP_input = pd.read_csv(HERE + "/test_LP_input.csv", index_col=0).reset_index(drop=True)
+	teacher = pd.read_csv(HERE + "/test_teacher_Df.csv", index_col=0)
+	prefs = pd.read_csv(HERE + "/test_pref_input_df.csv", index_col=0).reset_index(drop=True)
+	prefs = prefs.drop("Unnamed: 0", axis=1)
+	prox = pd.read_csv(HERE + "/test_prox.csv")
+
+	LP_input, prefs, prox = add_rr_rows(LP_input, prefs, prox)
+
+	student_dict = {}
+	for i in prefs.index:
+		student_dict[i] = Student(s_id=i, grade=9)
+
+	num_courses = {}
+	for subject in list(prox.columns)[1:]:
+		num_courses[subject] = pd.Series(np.zeros(prefs.shape[0]))
+
+	return {"prefs":prefs, "LP_input":LP_input, "teacher":teacher,
+		"student_dict":student_dict, "num_courses":num_courses,
+		"rr_df":pd.DataFrame(columns=["RR1", "RR2", "RR3"]),
+		"requirements":[], "prox":prox}
+
+
+def load_model_verification():
+	"""
+	The choice files of `Model Verification` (a few students picking
+	between three whole schedules of six courses), each course is ranked
+	by the best schedule it is in. There is no course data, so every
+	course gets its own teacher, room for everyone and no proximity
+	"""
+	at = os.path.join(HERE, "..", "Model Verification")
+	choices = [pd.read_csv(at + "/Test" + n + "Choice.csv").dropna(how="all")
+		for n in ["First", "Second", "Third"]]
+	students = list(choices[0]["Student"])
+	courses = list(choices[0].columns[1:])
+
+	prefs = pd.DataFrame(0, index=range(len(students)), columns=courses)
+	for rank in [3, 2, 1]:
+		for i, student in enumerate(students):
+			row = choices[rank-1][choices[rank-1]["Student"] == student]
+			for course in courses:
+				if not row.empty and row[course].iloc[0] == 1:
+					prefs.loc[i, course] = rank
+
+	LP_input = pd.DataFrame({"Course Name":courses, "Double Period":np.nan,
+		"HS Category":np.nan, "MS Category":np.nan, "Max":len(students), "Min":0,
+		"Number of Instances":np.nan, "Required Grades":np.nan, "Room Type":np.nan})
+	teacher = pd.DataFrame({"Course Name":courses,
+		"Teacher Name":["Teacher " + str(k + 1) for k in range(len(courses))]})
+	prox = pd.DataFrame({"Course Name":courses, "A":np.zeros(len(courses))})
+
+	LP_input, prefs, prox = add_rr_rows(LP_input, prefs, prox)
+
+	student_dict = {}
+	for i in prefs.index:
+		student_dict[i] = Student(s_id=i, grade=9)
+
+	return {"prefs":prefs, "LP_input":LP_input, "teacher":teacher,
+		"student_dict":student_dict,
+		"num_courses":{"A":pd.Series(np.zeros(prefs.shape[0]))},
+		"rr_df":pd.DataFrame(columns=["RR1", "RR2", "RR3"]),
+		"requirements":[], "prox":prox}
+
+
+# name --> function that loads the instance
+INSTANCES = {"OptTestFiles":load_opt_test_files,
+			"real_data":load_real_data,
+			"gui_test":load_gui_test_files,
+			"model_verification":load_model_verification}
+
+
+def build_optimizer(instance, GAP=.3, symmetry_order=None, **options):
+	"""
+	Takes in an instance dictionary (from one of the loaders), creates the
+	Optimizer with the given options and adds the constraints and objective
+	the same way `gui3.MainApplication.optimize` does
+	(plus symmetry breaking on sections if `symmetry_order` is given)
+	"""
+	O = Optimizer(GAP=GAP, **instance, **options)
+	calls = ["add_basic_constraints", "add_max_constraint",
+		"add_proximity_constraints", "add_teacher_constraints",
+		"add_course_constraints"]
+	if O.requirements is not None:
+		calls.append("add_grade_level_requirements")
+	calls += ["add_room_constraints", "add_rr_constraints"]
+	if O.other_indicies != []:
+		calls.append("add_period_constraints")
+	if symmetry_order is not None:
+		calls.append(("add_symmetry_constraints", symmetry_order))
+	calls.append("set_objective")
+	O.build(calls)
+	return O
+
+
+def solve(O, time_limit):
+	"""
+	Solves a built Optimizer quietly with a time limit, returns a
+	dictionary of the solve time, status, objective, gap and node count
+	"""
+	O.m.hideOutput()
+	O.m.setRealParam('limits/time', time_limit)
+	start = timeit.default_timer()
+	O.optimize()
+	solve_time = timeit.default_timer() - start
+
+	result = {"solve time":solve_time, "status":O.m.getStatus(),
+		"nodes":O.m.getNTotalNodes(), "objective":np.nan, "gap":np.nan}
+	if O.m.getNSols() > 0:
+		result["objective"] = O.m.getObjVal()
+		result["gap"] = O.m.getGap()
+	return result
+
+
+def compare_linking(names=None, time_limit=600, GAP=.3):
+	"""
+	Builds and solves each instance with both `linking` formulations,
+	returns a DataFrame with the build time, model size, LP bound,
+	solve time and result of each run
+	"""
+	if names is None:
+		names = list(INSTANCES.keys())
+
+	rows = []
+	for name in names:
+		instance = INSTANCES[name]()
+		for linking in ["student", "aggregate"]:
+			start = timeit.default_timer()
+			O = build_optimizer(instance, GAP=GAP, linking=linking)
+			build_time = timeit.default_timer() - start
+
+			num_vars = O.m.getNVars()
+			num_cons = O.m.getNConss()
+			lp_bound = O.get_lp_bound(time_limit)
+			if lp_bound is None:
+				lp_bound = np.nan
+
+			row = {"instance":name, "linking":linking,
+				"build time":build_time, "variables":num_vars,
+				"constraints":num_cons, "LP bound":lp_bound}
+			row.update(solve(O, time_limit))
+			rows.append(row)
+			print(row)
+
+	return pd.DataFrame(rows)
+
+
+# name --> (SCIP `misc/usesymmetry`, section order) for `compare_symmetry`
+SYMMETRY_RUNS = {"SCIP default":(None, None),
+				"SCIP symmetry off":(0, None),
+				"period order":(0, "period"),
+				"enrollment order":(0, "enrollment")}
+
+
+def compare_symmetry(names=None, time_limit=600, GAP=.3):
+	"""
+	Solves each instance with and without SCIP's symmetry handling and
+	with the section ordering constraints, returns a DataFrame with the
+	number of symmetric section groups, node count, time and result of
+	each run
+	"""
+	if names is None:
+		names = list(INSTANCES.keys())
+
+	rows = []
+	for name in names:
+		instance = INSTANCES[name]()
+		for run, (symmetry, order) in SYMMETRY_RUNS.items():
+			O = build_optimizer(instance, GAP=GAP, symmetry=symmetry,
+				symmetry_order=order)
+			row = {"instance":name, "run":run,
+				"groups":len(O.get_symmetric_sections())}
+			row.update(solve(O, time_limit))
+			rows.append(row)
+			print(row)
+
+	return pd.DataFrame(rows)
+
+
+def compare_objectives(names=None, time_limit=600, GAP=.3, tolerance=0,
+		greedy=False):
+	"""
+	Solves each instance with the weighted objective (`set_objective`) and
+	tier by tier (`Optimizer.optimize_tiered`, which gets `time_limit` for
+	each tier), both starting from the greedy schedule if `greedy`.
+	Returns a DataFrame with the solve time, status and the weighted
+	objective of the schedule each one found
+	"""
+	if names is None:
+		names = list(INSTANCES.keys())
+
+	rows = []
+	for name in names:
+		instance = INSTANCES[name]()
+
+		O = build_optimizer(instance, GAP=GAP)
+		if greedy:
+			O.greedy_start()
+		row = {"instance":name, "objective function":"weighted"}
+		row.update(solve(O, time_limit))
+		rows.append(row)
+		print(row)
+
+		O = build_optimizer(instance, GAP=GAP)
+		if greedy:
+			O.greedy_start()
+		O.m.hideOutput()
+		start = timeit.default_timer()
+		objective = O.optimize_tiered(tolerance, time_limit)
+		row = {"instance":name, "objective function":"tiered",
+			"solve time":timeit.default_timer() - start,
+			"status":O.m.getStatus(), "nodes":O.m.getNTotalNodes(),
+			"objective":np.nan if objective is None else objective,
+			"gap":np.nan}
+		rows.append(row)
+		print(row)
+
+	return pd.DataFrame(rows)
+
+
+def get_peak_memory():
+	"""
+	Returns the peak memory of this process in MB (SCIP's included),
+	NaN where the `resource` module is missing
+	"""
+	if resource is None:
+		return np.nan
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# bytes on macOS, kilobytes everywhere else
+	return peak/1024**2 if sys.platform == "darwin" else peak/1024
+
+
+def run_instance(name, time_limit, seed, GAP, greedy):
+	"""
+	Runs in a worker process (so the peak memory is its own), loads the
+	instance, builds it, starts from the greedy schedule if `greedy` (as
+	the GUI does) and solves it with SCIP's random seed shifted by `seed`.
+	Returns the row of the results
+	"""
+	with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+		instance = INSTANCES[name]()
+		start = timeit.default_timer()
+		O = build_optimizer(instance, GAP=GAP)
+		row = {"instance":name, "build time":timeit.default_timer() - start,
+			"variables":O.m.getNVars(), "constraints":O.m.getNConss()}
+
+		O.m.setIntParam("randomization/randomseedshift", seed)
+		start = timeit.default_timer()
+		if greedy:
+			try:
+				O.greedy_start()
+			except ValueError:
+				pass
+		row["greedy time"] = timeit.default_timer() - start
+		row.update(solve(O, time_limit))
+	row["peak memory"] = get_peak_memory()
+	return row
+
+
+def run_benchmark(names=None, time_limit=60, seed=0, GAP=.3, greedy=True,
+		results_file=RESULTS_FILE):
+	"""
+	Runs each instance end to end, one at a time in its own process, and
+	returns a DataFrame with the build time, solve time, nodes, gap,
+	objective and peak memory (MB) of each. The results are also written
+	to `results_file` (if not None)
+	"""
+	if names is None:
+		names = list(INSTANCES.keys())
+
+	# (spawned, the runs must not share SCIP with this process)
+	context = multiprocessing.get_context("spawn")
+	rows = []
+	for name in names:
+		with context.Pool(1) as pool:
+			row = pool.apply(run_instance, (name, time_limit, seed, GAP, greedy))
+		row.update({"time limit":time_limit, "seed":seed, "GAP":GAP,
+			"greedy":greedy})
+		rows.append(row)
+		print(row)
+
+	results = pd.DataFrame(rows)
+	if results_file is not None:
+		results.to_csv(results_file, index=False)
+	return results
+
+
+# measure --> how it can get worse, see `is_regression`
+MEASURES = {"build time":"time", "solve time":"time", "nodes":"size",
+			"peak memory":"size", "gap":"gap", "objective":"objective"}
+
+
+def is_regression(measure, baseline, result, tolerance=.2, min_seconds=1):
+	"""
+	True if `result` is worse than `baseline` for the measure: times
+	and sizes that grew by more than `tolerance` (times also by more than
+	`min_seconds`, so timer noise on the small instances is left out), a
+	gap that grew by more than a point, or a lower objective. Losing the
+	schedule (NaN objective or gap) is a regression too
+	"""
+	kind = MEASURES[measure]
+	if np.isnan(baseline):
+		return False
+	if np.isnan(result):
+		return True
+	if kind == "time":
+		return result > baseline*(1 + tolerance) and result - baseline > min_seconds
+	if kind == "size":
+		return result > baseline*(1 + tolerance)
+	if kind == "gap":
+		return result > baseline + .01
+	return result < baseline - 1e-6*max(1, abs(baseline))
+
+
+def compare_to_baseline(results, baseline_file=BASELINE_FILE, tolerance=.2,
+		min_seconds=1):
+	"""
+	Compares benchmark results (from `run_benchmark`) with the ones saved
+	at `baseline_file`, returns a DataFrame with a row per instance and
+	measure (see MEASURES) of the baseline, the result, the change and
+	whether it is a regression (see `is_regression`), and prints the
+	regressions. Instances that are not in the baseline are left out
+	"""
+	baseline = pd.read_csv(baseline_file).set_index("instance")
+	rows = []
+	for _, row in results.iterrows():
+		if row["instance"] not in baseline.index:
+			print("\t" + row["instance"], "is not in the baseline")
+			continue
+		for measure in MEASURES:
+			before = float(baseline.loc[row["instance"], measure])
+			after = float(row[measure])
+			rows.append({"instance":row["instance"], "measure":measure,
+				"baseline":before, "result":after, "change":after - before,
+				"regression":is_regression(measure, before, after, tolerance,
+					min_seconds)})
+
+	diff = pd.DataFrame(rows, columns=["instance", "measure", "baseline",
+		"result", "change", "regression"])
+	for _, row in diff[diff["regression"]].iterrows():
+		print("\tRegression on", row["instance"] + ":", row["measure"],
+			row["baseline"], "-->", row["result"])
+	if not diff["regression"].any():
+		print("\tNo regressions against the baseline")
+	return diff
+
+
+if __name__ == "__main__":
+	results = run_benchmark(sys.argv[1:] or None)
+	if os.path.exists(BASELINE_FILE):
+		compare_to_baseline(results)
+	else:
+		results.to_csv(BASELINE_FILE, index=False)
+		print("Saved as the baseline:", BASELINE_FILE)
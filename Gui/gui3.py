@@ -196,6 +196,7 @@ class MainApplication(tk.Frame):
 		Button to save the current configuration
 		Button to load a previously saved configuration
 		Slider to set optimizaiton speed (inverse MIPGap)
+		Button to estimate the best possible score (to pick the gap)
 		Button to start optimization
 
 		set up with a grid layout
@@ -221,16 +222,22 @@ class MainApplication(tk.Frame):
 			orient=tk.HORIZONTAL, resolution=0.01, length=200)
 		self.slider.grid(row=4, column=1, columnspan=2)
 
+		# Bounds on the score, to help pick the gap
+		tk.Button(self.opt_frame, text="Estimate Best Score",
+			command=lambda: self.busy(self.estimate)).grid(row=5, column=1, padx=15)
+		self.estimate_label = tk.Label(self.opt_frame, text="")
+		self.estimate_label.grid(row=5, column=2, padx=15)
+
 		# Select Save Location
 		tk.Button(self.opt_frame, text="Select Save Location", 
-			command=self.set_opt_output_loc).grid(row=5, column=1, 
+			command=self.set_opt_output_loc).grid(row=6, column=1, 
 			columnspan=2, pady=5)
 
 		# Optimize Button
 		tk.Button(self.opt_frame, text="Create Schedule",
 			 highlightbackground="red", pady=2, width=20, height=4,
 			 font=("Helvetica", 14, "bold"),
-			 command = self.optimize).grid(row=6,
+			 command = lambda: self.busy(self.optimize)).grid(row=7,
 			column=1, columnspan=2, pady=15)
 
 
@@ -683,41 +690,52 @@ class MainApplication(tk.Frame):
 		self.optimization_output_directory = directory
 
 
-	def optimize(self):
+	def show_progress(self, record):
 		"""
-		Runs the schedule optimizer
-		First: verifies that we have all the necessary data
-		Seoncd: Checks the save location
-		print("Put your function here")
+		Called by the Optimizer on each new best solution, prints the
+		bounds and gap and keeps the window responsive during the solve
+		(run it inside `busy`, the window handles clicks here)
 		"""
+		print("%.0f s: best %.1f, bound %.1f, gap %.1f%%" % (record["seconds"],
+			record["primal"], record["dual"], 100*record["gap"]))
+		self.master.update()
 
-		# still_needed = []
-		# # Verify the required information
-		# if self.preference_input_df is None:
-		# 	still_needed.append("Preferences")
-		# # else:
-		# # 	# save it down for optimizer debugging
-		# # 	self.preference_input_df.to_csv("OptTestFiles/prefs2.csv")
-		# if self.LP_input is None:
-		# 	still_needed.append("LP_input")
-		# # else:
-		# # 	self.LP_input.to_csv("OptTestFiles/LP_input2.csv")
-		# if self.teacher_df is None:
-		# 	still_needed.append("Teacher File (secondary)")
-		# # else:
-		# # 	self.teacher_df.to_csv("OptTestFiles/teacher2.csv")
-		# # if self.optimization_output_directory is None:
-		# # 	still_needed.append("Save location for optimization")
-
-		# s = ""
-		# if len(still_needed) > 0:
-		# 	s = str(still_needed)
-		# 	messagebox.showerror("Error", "You are missing the following\n\n" + s)
-		# 	return 
+	def busy(self, action):
+		"""
+		Runs `action` (`estimate` or `optimize`) with the Optimization Menu,
+		the File menu and the window's close button turned off, otherwise a
+		click during the solve (see `show_progress`) would start another
+		build and solve inside it, or close the window under it
+		"""
+		widgets = [w for w in self.opt_frame.winfo_children()
+			if isinstance(w, (tk.Button, tk.Scale))]
+		for w in widgets:
+			w.config(state=tk.DISABLED)
+		self.menubar.menu.entryconfig("File", state=tk.DISABLED)
+		self.master.protocol("WM_DELETE_WINDOW", lambda: None)
+		try:
+			return action()
+		finally:
+			for w in widgets:
+				w.config(state=tk.NORMAL)
+			self.menubar.menu.entryconfig("File", state=tk.NORMAL)
+			self.master.protocol("WM_DELETE_WINDOW", self.master.destroy)
 
+	def build_optimizer(self):
+		"""
+		Creates the Optimizer from the loaded data and the GAP slider, and
+		adds the constraints and the objective, returns None (after showing
+		the problems) if the inputs can't give a schedule
+		"""
 		# Get GAP value from slider
 		GAP = self.slider.get()
 
+		# re-runs on the same inputs (e.g. only the GAP changed) read the
+		# model saved by the last run instead of building it again
+		cache_dir = None
+		if self.optimization_output_directory is not None:
+			cache_dir = self.optimization_output_directory + "/model_cache"
+
 		# Create optimization instance
 		# THIS CALL NEEDS TO BE FIXED; MAKE SURE EVERYTHING IN RIGHT SPOT
 
@@ -739,38 +757,108 @@ class MainApplication(tk.Frame):
 		# test re-index
 		#self.LP_input = self.LP_input.reindex(range(self.LP_input.shape[0]))
 
-		O = Optimizer(prefs = self.preference_input_df,
-					LP_input = self.LP_input,
-					teacher = self.teacher_df,
-					GAP = GAP,
-					requirements = self.requirements,
-					prox = self.prox,
-					student_dict = self.student_dict,
-					num_courses = self.need_course_num_dict,
-					save_location  = self.optimization_output_directory,
-					rr_df = self.rr_df)
+		try:
+			O = Optimizer(prefs = self.preference_input_df,
+						LP_input = self.LP_input,
+						teacher = self.teacher_df,
+						GAP = GAP,
+						requirements = self.requirements,
+						prox = self.prox,
+						student_dict = self.student_dict,
+						num_courses = self.need_course_num_dict,
+						save_location  = self.optimization_output_directory,
+						rr_df = self.rr_df,
+						cache_dir = cache_dir,
+						progress = self.show_progress,
+						checkpoint_interval = 300)
+		except InputError as e:
+			s = "The inputs can't give a schedule:\n\n"
+			s += "\n".join(problem["message"] for problem in e.problems)
+			messagebox.showerror("Error", s)
+			return None
 
 		print(O.S)
 		print(O.Cd)
 		print(O.I_C_dict)
 
 		print("Adding Constraints")
-		O.add_basic_constraints()
-		O.add_max_constraint()
-		#self.add_min_constraint()
-		O.add_proximity_constraints()
-		O.add_teacher_constraints()
-		O.add_course_constraints()
+		calls = ["add_basic_constraints", "add_max_constraint",
+			#"add_min_constraint",
+			"add_proximity_constraints", "add_teacher_constraints",
+			"add_course_constraints"]
 
 		if self.requirements is not None:
-			O.add_grade_level_requirements()
+			calls.append("add_grade_level_requirements")
 
-		O.add_room_constraints()
-		O.add_rr_constraints()
-		#O.add_period_constraints() # ONly if Other courses are in input
+		calls += ["add_room_constraints", "add_rr_constraints"]
+		#calls.append("add_period_constraints") # ONly if Other courses are in input
+		calls.append("set_objective")
+		O.build(calls)
 		print("Constraints Added")
 
-		O.set_objective()
+		return O
+
+	def estimate(self):
+		"""
+		Shows bounds on the best possible score next to the speed slider
+		(see `Optimizer.estimate`), a schedule found with a gap of .1 is
+		within 10% of them
+		"""
+		O = self.build_optimizer()
+		if O is None:
+			return
+		bounds = O.estimate()
+		if bounds["best"] is None:
+			self.estimate_label.config(text="No estimate in time")
+			return
+		text = {}
+		for name in ["LP", "assignment"]:
+			text[name] = "not found in time" if bounds[name] is None \
+				else "%.0f" % bounds[name]
+		self.estimate_label.config(text="Best possible score: %.0f" % bounds["best"] +
+			"\n(LP %s, ignoring periods %s)" % (text["LP"], text["assignment"]))
+
+	def optimize(self):
+		"""
+		Runs the schedule optimizer
+		First: verifies that we have all the necessary data
+		Seoncd: Checks the save location
+		print("Put your function here")
+		"""
+
+		# still_needed = []
+		# # Verify the required information
+		# if self.preference_input_df is None:
+		# 	still_needed.append("Preferences")
+		# # else:
+		# # 	# save it down for optimizer debugging
+		# # 	self.preference_input_df.to_csv("OptTestFiles/prefs2.csv")
+		# if self.LP_input is None:
+		# 	still_needed.append("LP_input")
+		# # else:
+		# # 	self.LP_input.to_csv("OptTestFiles/LP_input2.csv")
+		# if self.teacher_df is None:
+		# 	still_needed.append("Teacher File (secondary)")
+		# # else:
+		# # 	self.teacher_df.to_csv("OptTestFiles/teacher2.csv")
+		# # if self.optimization_output_directory is None:
+		# # 	still_needed.append("Save location for optimization")
+
+		# s = ""
+		# if len(still_needed) > 0:
+		# 	s = str(still_needed)
+		# 	messagebox.showerror("Error", "You are missing the following\n\n" + s)
+		# 	return 
+
+		O = self.build_optimizer()
+		if O is None:
+			return
+
+		# quick schedule to start from (and to fall back on)
+		try:
+			O.greedy_start()
+		except ValueError as e:
+			print("Greedy schedule failed:", e)
 
 		O.optimize()
 
@@ -782,7 +870,13 @@ class MainApplication(tk.Frame):
 			return 
 
 
-		O.assign_value_dicts()
+		if O.m.getNSols() > 0:
+			O.assign_value_dicts()
+		elif O.XV != {}:
+			# stopped before SCIP found anything, keep the greedy schedule
+			O.S = O.all_S
+			messagebox.showinfo("Note", "The solve was stopped before it found "
+				"a schedule, showing the greedy schedule instead.")
 
 		# Save solution object
 		try:
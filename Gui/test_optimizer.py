@@ -0,0 +1,131 @@
+# test_optimizer.py
+# Spring 2018
+
+"""
+Checks of Optimizer pieces on small made up inputs and on the
+OptTestFiles instance, run with pytest from the Gui directory
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Optimizer import *
+
+
+# the Optimizer reads its inputs with DataFrame.as_matrix (gone in pandas 1.0)
+needs_as_matrix = pytest.mark.skipif(not hasattr(pd.DataFrame, "as_matrix"),
+	reason="needs DataFrame.as_matrix (pandas < 1.0)")
+
+
+def make_room_optimizer(room_types, doubles=[]):
+	"""
+	Returns an Optimizer with only what `match_rooms` uses set, for
+	courses with the given room types (None for a general course), the
+	courses in `doubles` are the first halves of double periods
+	"""
+	O = Optimizer.__new__(Optimizer)
+	O.Cd = {j:"Course " + str(j) for j in range(len(room_types))}
+	O.C = range(len(room_types))
+	O.c_mini = list(O.C)
+	O.T = [1, 2, 3, 4, 7, 8]
+	O.Db = np.zeros(len(room_types), dtype=int)
+	for j in doubles:
+		O.Db[j] = 1
+
+	# the rooms of `set_room_data`
+	O.R = ["U1", "Steve", "U2", "U3", "U4/5", "U6", "U7", "L2", "L3", "Library",
+		"Art", "L4", "L6", "Sci A", "Sci B", "Sci C", "Music Room", "Gym", "Gym2",
+		"RR1", "RR2", "RR3"]
+	O.room_constrained_subjects = ["Science", "Art", "Music", "Gym", "Resource"]
+	O.constrained_rooms = {"Science":["Sci A", "Sci B", "Sci C"], "Art":["Art"],
+		"Music":["Music Room"], "Gym":["Gym", "Gym2"],
+		"Resource":["RR1", "RR2", "RR3"]}
+	O.constrained_courses = {subject:[j for j in O.C if room_types[j] == subject]
+		for subject in O.room_constrained_subjects}
+	return O
+
+
+def test_match_rooms_keeps_double_out_of_needed_room():
+	# period 1: 15 general courses (the first one the first half of a
+	# double), as many as the general and science rooms together
+	# period 2: the second half and 3 science courses
+	room_types = [None]*16 + ["Science"]*3
+	O = make_room_optimizer(room_types, doubles=[0])
+	CourseV = {(j,t):0 for j in O.C for t in O.T}
+	for j in [0] + list(range(2, 16)):
+		CourseV[j,1] = 1
+	for j in [1, 16, 17, 18]:
+		CourseV[j,2] = 1
+
+	RoomV = O.match_rooms(CourseV)
+
+	room = [s for s in O.R if RoomV[0,s,1] == 1]
+	assert len(room) == 1
+	assert RoomV[1,room[0],2] == 1
+	assert room[0] not in O.constrained_rooms["Science"]
+	for t in O.T:
+		for s in O.R:
+			assert sum(RoomV[j,s,t] for j in O.C) <= 1
+	for (j, t), v in CourseV.items():
+		assert sum(RoomV[j,s,t] for s in O.R) == v
+		for s in O.R:
+			if RoomV[j,s,t] == 1:
+				assert s in O.get_allowed_rooms(j)
+
+
+@needs_as_matrix
+def test_tiered_score_matches_weighted_objective():
+	# one tier with a scale of 20, the Other courses should still count once
+	from benchmark import load_opt_test_files, build_optimizer
+	instance = load_opt_test_files()
+	seniority = {grade:20 for grade in range(5, 13)}
+
+	# only a few courses open, so the students need Other courses
+	LP_input = instance["LP_input"].copy()
+	names = LP_input["Course Name"]
+	closed = (LP_input.index >= 4) & ~names.str.contains("Other") & \
+		~names.isin(["RR1", "RR2", "RR3"])
+	LP_input.loc[closed, "Max"] = 0
+	instance["LP_input"] = LP_input
+
+	weighted = build_optimizer(instance, GAP=0, seniority=seniority)
+	weighted.m.hideOutput()
+	weighted.optimize()
+
+	tiered = build_optimizer(instance, GAP=0, seniority=seniority)
+	tiered.m.hideOutput()
+	score = tiered.optimize_tiered()
+
+	assert tiered.get_objective_tiers()[-1][1] == 20
+	assert sum(weighted.m.getVal(weighted.X[i,j]) for i in weighted.S
+		for j in weighted.other_indicies) > 0
+	assert abs(score - weighted.m.getObjVal()) < 1e-6
+
+
+@needs_as_matrix
+def test_cached_model_has_no_repair_fixings(tmp_path):
+	# a repair on a freshly built (and cached) model, then the same build
+	# again, should read the model without the repair's bounds
+	from benchmark import load_opt_test_files, build_optimizer
+	instance = load_opt_test_files()
+
+	first = build_optimizer(instance, GAP=.5)
+	first.m.hideOutput()
+	first.m.setParam("limits/time", 60)
+	first.optimize()
+	first.assign_value_dicts()
+	solution = first.get_solution()
+
+	repaired = build_optimizer(instance, GAP=.5, cache_dir=str(tmp_path))
+	assert not repaired.from_cache
+	repaired.repair(solution, [0])
+	repaired.m.hideOutput()
+	repaired.m.setParam("limits/time", 10)
+	repaired.optimize()
+
+	cached = build_optimizer(instance, GAP=.5, cache_dir=str(tmp_path))
+	assert cached.from_cache
+	fixed = [var for var in cached.m.getVars()
+		if var.getLbOriginal() == var.getUbOriginal()]
+	assert fixed == []